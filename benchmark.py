@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+from z3 import And, Bool, Not, Or, Solver
+
+from kmeans import KMeans
+from constants import AVAILABLE_ENCODINGS, AVAILABLE_ENGINES, AVAILABLE_METRICS
+
+# Fixed configurations timed by the regression suite, covering every property with both engines and
+# encodings; expected is the outcome every run has to reproduce (the unsat cases all use the bmc
+# engine, which is complete). Proving EMPTY_CENTER unsat requires filling the grid, which takes
+# minutes even at the smallest sizes, so it only has sat cases.
+SUITE = [
+    dict(name="empty_small", expected="sat", config=dict(num_iters=3, num_points=6, num_centers=3, grid_limit=2,
+         random_centers=False, property="EMPTY_CENTER", seed=0, engine="incremental", encoding="flat")),
+    dict(name="empty_array", expected="sat", config=dict(num_iters=3, num_points=8, num_centers=3, grid_limit=3,
+         random_centers=False, property="EMPTY_CENTER", seed=0, engine="incremental", encoding="array")),
+    dict(name="overlap_small", expected="sat", config=dict(num_iters=3, num_points=6, num_centers=3, grid_limit=2,
+         random_centers=False, property="OVERLAP_CENTER", seed=0, engine="incremental", encoding="flat")),
+    dict(name="overlap_bmc", expected="sat", config=dict(num_iters=3, num_points=5, num_centers=2, grid_limit=2,
+         random_centers=True, property="OVERLAP_CENTER", seed=0, engine="bmc", encoding="flat")),
+    dict(name="overlap_bmc_unsat", expected="unsat", config=dict(num_iters=2, num_points=6, num_centers=3, grid_limit=1,
+         random_centers=True, property="OVERLAP_CENTER", seed=0, engine="bmc", encoding="flat")),
+    dict(name="overlap_bmc_unsat_large", expected="unsat", config=dict(num_iters=3, num_points=4, num_centers=3,
+         grid_limit=1, random_centers=True, property="OVERLAP_CENTER", seed=0, engine="bmc", encoding="flat")),
+    dict(name="empty_each", expected="sat", config=dict(num_iters=3, num_points=8, num_centers=3, grid_limit=3,
+         random_centers=False, property="EMPTY_CENTER_EACH_ITERATION", seed=0, engine="incremental", encoding="flat")),
+    dict(name="empty_each_bmc", expected="sat", config=dict(num_iters=3, num_points=4, num_centers=3, grid_limit=1,
+         random_centers=True, property="EMPTY_CENTER_EACH_ITERATION", seed=0, engine="bmc", encoding="flat")),
+    dict(name="empty_each_bmc_unsat", expected="unsat", config=dict(num_iters=2, num_points=7, num_centers=2,
+         grid_limit=1, random_centers=True, property="EMPTY_CENTER_EACH_ITERATION", seed=0, engine="bmc", encoding="flat")),
+    dict(name="overlap_each", expected="sat", config=dict(num_iters=3, num_points=6, num_centers=3, grid_limit=2,
+         random_centers=False, property="OVERLAP_CENTER_EACH_ITERATION", seed=0, engine="incremental", encoding="flat")),
+    dict(name="overlap_each_bmc", expected="sat", config=dict(num_iters=3, num_points=4, num_centers=3, grid_limit=1,
+         random_centers=True, property="OVERLAP_CENTER_EACH_ITERATION", seed=1, engine="bmc", encoding="flat")),
+    dict(name="overlap_each_bmc_unsat", expected="unsat", config=dict(num_iters=3, num_points=5, num_centers=2,
+         grid_limit=2, random_centers=True, property="OVERLAP_CENTER_EACH_ITERATION", seed=0, engine="bmc", encoding="flat")),
+]
+
+# times below this (in seconds) are too noisy to flag as regressions
+MIN_REGRESSION_TIME = 0.05
+# number of pigeons of the calibration problem (see calibrate), which takes about a quarter of a second
+CALIBRATION_SIZE = 9
+
+def calibrate() -> float:
+    """
+    Times a fixed workload that doesn't involve the model (proving that CALIBRATION_SIZE pigeons
+    don't fit into one hole fewer with z3), which measures how fast the machine is at the moment. Suite
+    times are compared relative to it, so that a slower (or busier) machine isn't taken for a slower model.
+    """
+    start = time.perf_counter()
+    holes = CALIBRATION_SIZE - 1
+    in_hole = [[Bool(f"in_{pigeon}_{hole}") for hole in range(holes)] for pigeon in range(CALIBRATION_SIZE)]
+    s = Solver()
+    s.add([Or(holes_of_pigeon) for holes_of_pigeon in in_hole])
+    s.add([Not(And(in_hole[pigeon][hole], in_hole[other][hole])) for hole in range(holes)
+           for pigeon in range(CALIBRATION_SIZE) for other in range(pigeon + 1, CALIBRATION_SIZE)])
+    s.check()
+    return time.perf_counter() - start
+
+def time_search(num_iters: int, num_points: int, num_centers: int, grid_limit: int, random_centers: bool, property: str,
+                seed: int, **options) -> Tuple[str, float]:
+    """
+    Constructs a KMeans object (which searches for an instance) and times it. Returns the outcome of
+    the search ("sat", "unsat", "unknown" or "budget_exhausted"; see KMeans.status) and the wall time
+    taken, in seconds.
+    params:
+        num_iters, num_points, num_centers, grid_limit, random_centers, property: as for KMeans
+        seed: seed for the random center initialization (so that every compared option gets the same centers)
+        options: any other KMeans keyword arguments (ex: engine, encoding)
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # KMeans prints the instance it finds
+        kmeans = KMeans(num_iters, num_points, num_centers, grid_limit, random_centers, property, seed=seed, **options)
+    return kmeans.status, time.perf_counter() - start
+
+def run_case(config: dict, conn):
+    """
+    Times a single configuration (in a fresh worker process, so that the peak memory usage is its
+    own) and sends the outcome, the time taken and the peak resident set size (in MB) through the
+    provided connection.
+    params:
+        config: the KMeans arguments of the configuration
+        conn: the connection to send the measurements through
+    """
+    status, elapsed = time_search(**config)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # in KB on Linux
+    conn.send((status, elapsed, peak_rss))
+    conn.close()
+
+def run_suite(repeats: int) -> dict:
+    """
+    Runs every case of SUITE repeats times, each time in a new process, and prints the median and
+    95th percentile times and the peak memory usage of each. Returns them per case name, along with
+    the median time of the calibration workload, which is run (in this process, since it would change
+    the state of z3 that a case starts with) right before each of its runs.
+    params:
+        repeats: how many times to run each case
+    """
+    context = multiprocessing.get_context("spawn") # forked workers would start with this process' memory
+    results = {}
+    print(f"{'case':>24} {'result':>7} {'median (s)':>11} {'p95 (s)':>9} {'peak RSS (MB)':>14}")
+    for case in SUITE:
+        outcomes, times, peak_rss, calibrations = set(), [], 0.0, []
+        for _ in range(repeats):
+            calibrations.append(calibrate())
+            recv_conn, send_conn = context.Pipe(duplex=False)
+            process = context.Process(target=run_case, args=(case["config"], send_conn))
+            process.start()
+            send_conn.close()
+            outcome, elapsed, rss = recv_conn.recv()
+            process.join()
+            outcomes.add(outcome)
+            times.append(elapsed)
+            peak_rss = max(peak_rss, rss)
+        result = outcomes.pop() if len(outcomes) == 1 else "mixed"
+        results[case["name"]] = {"config": case["config"], "expected": case["expected"], "result": result,
+                                 "median": float(np.median(times)), "p95": float(np.percentile(times, 95)),
+                                 "peak_rss_mb": peak_rss, "times": times, "calibration": float(np.median(calibrations))}
+        row = results[case["name"]]
+        mark = "" if result == case["expected"] else f"  (expected {case['expected']})"
+        print(f"{case['name']:>24} {result:>7} {row['median']:>11.3f} {row['p95']:>9.3f} {row['peak_rss_mb']:>14.1f}{mark}",
+              flush=True)
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares the results of a suite run with a baseline run, and prints the cases whose median time
+    grew by more than the threshold past the baseline's 95th percentile time (so that the baseline's
+    own spread isn't flagged), or whose peak memory usage grew by more than the threshold, or whose
+    outcome is not the expected one. Times are scaled by how much slower the calibration workload ran
+    than in the baseline (see calibrate), so that a slower machine isn't flagged. Returns the names of
+    those cases.
+    params:
+        results: the results of run_suite
+        baseline: the results of an earlier run_suite
+        threshold: the relative increase above which a case is flagged (ex: 0.2 for 20%)
+    """
+    regressions = []
+    for name, result in results.items():
+        problems = []
+        if result["result"] != result["expected"]:
+            problems.append(f"result {result['result']} (expected {result['expected']})")
+        base = baseline.get(name)
+        if base is not None:
+            # baselines recorded before calibration was added aren't scaled
+            speed = result["calibration"] / base["calibration"] if "calibration" in base else 1.0
+            if result["median"] > base["p95"] * speed * (1 + threshold) and result["median"] > MIN_REGRESSION_TIME:
+                problems.append(f"median time {base['median']:.3f}s (p95 {base['p95']:.3f}s, calibration x{speed:.2f}) "
+                                f"-> {result['median']:.3f}s")
+            if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+                problems.append(f"peak RSS {base['peak_rss_mb']:.1f}MB -> {result['peak_rss_mb']:.1f}MB")
+        if problems:
+            regressions.append(name)
+            print(f"REGRESSION {name}: {', '.join(problems)}")
+    if not regressions:
+        print(f"No regressions (threshold {100 * threshold:.0f}%)")
+    return regressions
+
+def main(iters, points, centers, grids, random_centers: bool, property: str, seed: int, engines, encodings, metrics):
+    """
+    Times every combination of the provided sizes with every combination of the provided engines,
+    encodings and distance metrics, and prints a table of the results.
+    params:
+        iters, points, centers, grids: the values of num_iters, num_points, num_centers and grid_limit to try
+        random_centers, property, seed: as for time_search
+        engines: the engines to compare
+        encodings: the encodings to compare
+        metrics: the distance metrics to compare
+    """
+    print(f"{'i':>3} {'p':>3} {'c':>3} {'g':>3} {'engine':>12} {'encoding':>9} {'metric':>7} {'result':>7} {'time (s)':>9}")
+    for num_iters, num_points, num_centers, grid_limit in itertools.product(iters, points, centers, grids):
+        for engine, encoding, metric in itertools.product(engines, encodings, metrics):
+            result, elapsed = time_search(num_iters, num_points, num_centers, grid_limit, random_centers, property, seed,
+                                          engine=engine, encoding=encoding, metric=metric)
+            print(f"{num_iters:>3} {num_points:>3} {num_centers:>3} {grid_limit:>3} {engine:>12} {encoding:>9} {metric:>7} "
+                  f"{result:>7} {elapsed:>9.3f}", flush=True)
+
+if __name__ == '__main__':
+    """
+    Compares the solve times of the search engines and encodings across problem sizes, or (with
+    --suite) runs the fixed regression suite and compares it with a baseline.
+    """
+    parser = argparse.ArgumentParser("Benchmark: solve times of the k-Means model across sizes")
+
+    parser.add_argument("-i", "--num_iters", nargs="+", default=[3], type=int, help="Numbers of iterations to try")
+    parser.add_argument("-p", "--num_points", nargs="+", default=[4, 6], type=int, help="Numbers of datapoints to try")
+    parser.add_argument("-c", "--num_centers", nargs="+", default=[2, 3], type=int, help="Numbers of centers to try")
+    parser.add_argument("-g", "--grid_limit", nargs="+", default=[2, 3], type=int, help="Grid limits to try")
+    parser.add_argument("--random_centers", default=False, action="store_true",
+                        help="flag indicating whether or not to random initialize centers")
+    parser.add_argument("-prop", "--property", default="EMPTY_CENTER", type=str, help="which property to verify")
+    parser.add_argument("--seed", default=0, type=int, help="seed for the random center initialization")
+    parser.add_argument("--engines", nargs="+", default=sorted(AVAILABLE_ENGINES), type=str, help="engines to compare")
+    parser.add_argument("--encodings", nargs="+", default=sorted(AVAILABLE_ENCODINGS), type=str, help="encodings to compare")
+    parser.add_argument("--metrics", nargs="+", default=sorted(AVAILABLE_METRICS), type=str, help="distance metrics to compare")
+    parser.add_argument("--suite", default=False, action="store_true",
+                        help="run the fixed regression suite instead (the size, property and option arguments are ignored)")
+    parser.add_argument("--repeats", default=11, type=int, help="how many times to run each case of the suite")
+    parser.add_argument("--save", default=None, type=str, help="JSON file to save the suite's results to (ex: as a new baseline)")
+    parser.add_argument("--compare", default=None, type=str, help="JSON file of an earlier suite run to compare with")
+    parser.add_argument("--threshold", default=0.25, type=float,
+                        help="relative slowdown (past the baseline's 95th percentile, adjusted for the speed of the machine) "
+                             "or memory growth above which a case is flagged as a regression")
+
+    args = parser.parse_args()
+    if args.suite:
+        results = run_suite(args.repeats)
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+        baseline = {}
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        sys.exit(1 if compare(results, baseline, args.threshold) else 0)
+    main(args.num_iters, args.num_points, args.num_centers, args.grid_limit, args.random_centers, args.property,
+         args.seed, args.engines, args.encodings, args.metrics)
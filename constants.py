@@ -0,0 +1,12 @@
+# The options shared by the model (kmeans.py), the simulator and the command-line scripts. This module
+# has no dependencies, so that run.py's client mode can validate its arguments without loading z3.
+
+AVAILABLE_PROPERTIES = ("EMPTY_CENTER", "OVERLAP_CENTER", "EMPTY_CENTER_EACH_ITERATION", "OVERLAP_CENTER_EACH_ITERATION")
+AVAILABLE_ENGINES = ("incremental", "bmc")
+AVAILABLE_ENCODINGS = ("array", "flat")
+# "l1" (Manhattan), "l2sq" (squared Euclidean) or "linf" (Chebyshev)
+AVAILABLE_METRICS = ("l1", "l2sq", "linf")
+# strategies for choosing the initial centers: "free" leaves them to the solver, "uniform" draws each
+# coordinate uniformly from the grid, "file" reads them from a file, "farthest" picks datapoints by
+# farthest-point traversal, and "kmeans++" samples datapoints as k-means++ does
+AVAILABLE_INITS = ("free", "uniform", "file", "farthest", "kmeans++")
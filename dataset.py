@@ -0,0 +1,30 @@
+import os
+import numpy as np
+from typing import Tuple
+
+def load_points(path: str, dims: int = 2) -> Tuple[np.ndarray, ...]:
+    """
+    Loads a dataset of points with integer coordinates (the model's grid is integer valued).
+    Returns the coordinates of the points along each dimension (ex: x and y in 2D), as arrays. For a .npy
+    file with an integer dtype these are views into the memory map, so nothing is copied until the
+    constraints are built.
+    params:
+        path: a .npy file holding an array of shape (num_points, dims), which is memory-mapped rather
+              than read into memory, or a .csv file with one "x,y" row per point (or one column per
+              dimension; and optionally a header row)
+        dims: number of coordinates of every point
+    """
+    if os.path.splitext(path)[1].lower() == ".npy":
+        points = np.load(path, mmap_mode="r")
+    else:
+        try:
+            points = np.loadtxt(path, delimiter=",", ndmin=2)
+        except ValueError: # header row
+            points = np.loadtxt(path, delimiter=",", ndmin=2, skiprows=1)
+    if points.ndim != 2 or points.shape[1] != dims:
+        raise ValueError(f"Expected an array of shape (num_points, {dims}) in {path}, got {points.shape}")
+    if not np.issubdtype(points.dtype, np.integer):
+        if not np.array_equal(points, np.round(points)):
+            raise ValueError(f"Expected integer coordinates in {path}")
+        points = points.astype(np.int64)
+    return tuple(points[:, dim] for dim in range(dims))
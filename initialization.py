@@ -0,0 +1,82 @@
+import random
+from typing import List, Sequence, Tuple
+
+def point_distance(a: Sequence[int], b: Sequence[int], metric: str = "l1") -> int:
+    """
+    Computes the distance between two points with concrete coordinates.
+    params:
+        a, b: the coordinates of the points (one per dimension)
+        metric: one of "l1" (Manhattan), "l2sq" (squared Euclidean) or "linf" (Chebyshev)
+    """
+    diffs = [abs(x - y) for x, y in zip(a, b)]
+    if metric == "l2sq":
+        return sum(diff * diff for diff in diffs)
+    if metric == "linf":
+        return max(diffs)
+    if metric == "l1":
+        return sum(diffs)
+    raise ValueError(f"Unrecognized metric provided: {metric}")
+
+def uniform_centers(num_centers: int, grid_limit: int, dims: int, rng: random.Random) -> Tuple[List[int], ...]:
+    """
+    Draws every coordinate of every center uniformly from the grid. Returns the coordinates of the
+    centers along each dimension.
+    params:
+        num_centers: number of centers
+        grid_limit: how far from the origin the grid extends along every axis
+        dims: number of coordinates of every center
+        rng: the random number generator to draw from
+    """
+    centers = tuple([] for _ in range(dims))
+    for _ in range(num_centers):
+        for dim in range(dims):
+            centers[dim].append(rng.randint(-grid_limit, grid_limit))
+    return centers
+
+def farthest_point_centers(points: Tuple[Sequence[int], ...], num_centers: int, rng: random.Random,
+                           metric: str = "l1") -> Tuple[List[int], ...]:
+    """
+    Picks the centers among the datapoints by farthest-point traversal: the first one at random, and
+    each next one as the datapoint farthest away from its closest center so far (the first such
+    datapoint on ties). Returns the coordinates of the centers along each dimension.
+    params:
+        points: the coordinates of the datapoints along each dimension
+        num_centers: number of centers
+        rng: the random number generator to draw the first center with
+        metric: the distance between points and centers
+    """
+    coords = list(zip(*points))
+    chosen = [rng.randrange(len(coords))]
+    closest = [point_distance(point, coords[chosen[0]], metric) for point in coords]
+    while len(chosen) < num_centers:
+        chosen.append(max(range(len(coords)), key=lambda point_num: closest[point_num]))
+        closest = [min(d, point_distance(point, coords[chosen[-1]], metric)) for d, point in zip(closest, coords)]
+    return tuple([coords[point_num][dim] for point_num in chosen] for dim in range(len(points)))
+
+def kmeans_plus_plus_centers(points: Tuple[Sequence[int], ...], num_centers: int, rng: random.Random,
+                             metric: str = "l1") -> Tuple[List[int], ...]:
+    """
+    Samples the centers among the datapoints as k-means++ does: the first one uniformly, and each next
+    one with probability proportional to the squared distance from the datapoint to its closest center
+    so far (the distance itself for l2sq, which is squared already). If every datapoint is already a
+    center, the next one is drawn uniformly. Returns the coordinates of the centers along each dimension.
+    params:
+        points: the coordinates of the datapoints along each dimension
+        num_centers: number of centers
+        rng: the random number generator to sample from
+        metric: the distance between points and centers
+    """
+    coords = list(zip(*points))
+    def weight(point, center):
+        d = point_distance(point, center, metric)
+        return d if metric == "l2sq" else d * d
+
+    chosen = [rng.randrange(len(coords))]
+    weights = [weight(point, coords[chosen[0]]) for point in coords]
+    while len(chosen) < num_centers:
+        if sum(weights) == 0:
+            chosen.append(rng.randrange(len(coords)))
+        else:
+            chosen.append(rng.choices(range(len(coords)), weights=weights)[0])
+        weights = [min(w, weight(point, coords[chosen[-1]])) for w, point in zip(weights, coords)]
+    return tuple([coords[point_num][dim] for point_num in chosen] for dim in range(len(points)))
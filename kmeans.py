@@ -1,114 +1,540 @@
 from z3 import *
+import itertools
+import json
+import math
+import multiprocessing
 import random
+import threading
+import time
+import numpy as np
+from typing import Iterator, List, Tuple
+from constants import AVAILABLE_ENCODINGS, AVAILABLE_ENGINES, AVAILABLE_INITS, AVAILABLE_METRICS, AVAILABLE_PROPERTIES
+from initialization import farthest_point_centers, kmeans_plus_plus_centers, uniform_centers
+from profiler import Profiler
+from traces import axis_name, jsonl_header, save_trace, trace_names
+from simulator import random_search
 from visualizer import Visualizer
 
 # Defining a custom exception class
 class UnsatException(Exception):
     pass
 
+# Raised when a check is inconclusive (ex: it hit the per-check timeout)
+class UnknownException(Exception):
+    pass
+
+# Raised when the search runs out of its total time or memory budget
+class BudgetExhaustedException(Exception):
+    pass
+
+# Raised when a check is interrupted because its result isn't needed anymore (ex: an earlier seed of a
+# parallel search already led to an instance)
+class CancelledException(Exception):
+    pass
+
+# smallest memory budget (in megabytes) that is accepted: z3 takes about 17MB before any constraint is
+# built, and it crashes the process (rather than failing cleanly) if its limit is below that
+MIN_MEMORY_BUDGET = 32
+
 class KMeans(object):
 
-    def __init__(self, num_iters: int, num_points: int, num_centers: int, grid_limit: int, random_centers: bool, property: str):
+    def __init__(self, num_iters: int, num_points: int, num_centers: int, grid_limit: int, random_centers: bool, property: str,
+                 symmetry_breaking: bool = False, jobs: int = 1, seed: int = None, engine: str = "incremental",
+                 encoding: str = "array", presearch_budget: float = 0, search: bool = True, profile: bool = False,
+                 check_timeout: float = None, time_budget: float = None, memory_budget: int = None,
+                 points: Tuple[List[int], ...] = None, metric: str = "l1", dims: int = 2, init: str = None,
+                 init_centers: Tuple[List[int], ...] = None):
         """
         params:
             num_iters: number of iterations for which to run the algorithm
             num_points: number of datapoints
             num_centers: number of centers
             grid_limit: dimensions of the grid (ex: if grid_limit is 5, then the coordinates go from
-                        -5.0 to 5.0 along both axes)
-            random_centers: flag indicating whether or not to randomly initialize center coordinates (via constraints)
+                        -5.0 to 5.0 along every axis)
+            random_centers: flag indicating whether or not to randomly initialize center coordinates
+                            (the same as init="uniform")
             property: which property to verify (if any)
+            symmetry_breaking: flag indicating whether or not to prune seeds (and instances) that are
+                               symmetric to ones that are already being considered
+            jobs: number of worker processes across which to partition the seeds being searched
+            seed: seed for the random number generator used to initialize centers (a random one is
+                  picked if not provided)
+            engine: how to search for an instance; one of "incremental" (check one iteration at a time,
+                    fixing the centers for the next iteration after each check, and retry with
+                    different seeds) or "bmc" (encode every iteration symbolically and check once,
+                    which is slower but also complete)
+            encoding: how centers and assignments are represented; one of "array" (each iteration's
+                      centers are a z3 Array, and each point's center is an Int index into it) or
+                      "flat" (centers are plain Ints, and each point has one Bool per center, exactly
+                      one of which is true)
+            presearch_budget: how long (in seconds) to look for an instance by simulating random
+                              inputs before invoking the solver
+            search: flag indicating whether or not to search for an instance right away
+            profile: flag indicating whether or not to record where the search spends its time (in
+                     self.profiler; the seeds tried by parallel workers are not recorded)
+            check_timeout: how long (in seconds) a single solver check may run for; a check that times
+                           out is inconclusive, and the search moves on to the next seed
+            time_budget: how long (in seconds) the whole search may run for
+            memory_budget: how much memory (in megabytes) z3 may use, at least MIN_MEMORY_BUDGET; this is a
+                           global z3 setting, so it applies to every solver in the process
+            points: concrete coordinates of the first datapoints, one list per dimension (ex: a
+                    dataset loaded with dataset.load_points); only the remaining num_points - len(x)
+                    points are symbolic
+            metric: the distance between points and centers; one of "l1" (Manhattan), "l2sq" (squared
+                    Euclidean) and "linf" (Chebyshev)
+            dims: number of coordinates of every datapoint and center
+            init: how to initialize the centers; one of constants.AVAILABLE_INITS: "free" (the
+                  solver picks them), "uniform" (every coordinate drawn uniformly from the grid),
+                  "file" (the provided init_centers), "farthest" (datapoints picked by farthest-point
+                  traversal) or "kmeans++" (datapoints sampled as k-means++ does). Concrete centers are
+                  bound as constants; with symbolic datapoints, "farthest" and "kmeans++" are
+                  constraints on the centers instead (see constrain_initial_centers). By default,
+                  "uniform" if random_centers is set and "free" otherwise.
+            init_centers: coordinates of the initial centers for init="file", one list per dimension
         """
+        # the model silently falls back to its defaults for names it doesn't know (ex: a misspelled engine)
+        for name, value, available in (("property", property, AVAILABLE_PROPERTIES), ("engine", engine, AVAILABLE_ENGINES),
+                                       ("encoding", encoding, AVAILABLE_ENCODINGS), ("metric", metric, AVAILABLE_METRICS),
+                                       ("initialization", init, AVAILABLE_INITS)):
+            if value is not None and value not in available:
+                raise ValueError(f"Unrecognized {name} provided; must be one of {available}")
+        if dims < 1:
+            raise ValueError("There has to be at least one dimension")
+        if init_centers is not None and init != "file":
+            raise ValueError("Initial centers are only used with file initialization")
         self.num_iters = num_iters
         self.num_points = num_points
         self.num_centers = num_centers
         self.grid_limit = grid_limit
+        self.dims = dims
         self.random_centers = random_centers
         self.property = property
+        self.symmetry_breaking = symmetry_breaking
+        # datapoints with concrete coordinates come first; they are used as constants in the constraints.
+        # They are kept as arrays (ex: memory-mapped from a dataset) until the constraints are built
+        if points is not None and len(points) != dims:
+            raise ValueError(f"Fixed points with {len(points)} coordinates provided for {dims} dimensions")
+        self.fixed_points = tuple(np.asarray(coords, dtype=np.int64) for coords in points) if points is not None \
+            else tuple(np.zeros(0, dtype=np.int64) for _ in range(dims))
+        self.num_fixed_points = len(self.fixed_points[0])
+        if self.num_fixed_points > num_points:
+            raise ValueError(f"{self.num_fixed_points} fixed points provided for only {num_points} points")
+        self.jobs = jobs
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        # parallel workers draw the same random centers since they share the seed
+        self.rng = random.Random(self.seed)
+        self.engine = engine
+        self.encoding = encoding
+        self.metric = metric
+        self.init = init if init is not None else ("uniform" if random_centers else "free")
+        self.init_centers = init_centers
+        # concrete coordinates of the initial centers (one list per dimension), or None if they are symbolic
+        self.initial_centers = self.choose_initial_centers()
+        self.presearch_budget = presearch_budget
+        self.profiler = Profiler(profile)
+        self.check_timeout = check_timeout
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_budget if time_budget is not None else None
+        if memory_budget is not None:
+            if memory_budget < MIN_MEMORY_BUDGET:
+                raise ValueError(f"The memory budget has to be at least {MIN_MEMORY_BUDGET}MB, not {memory_budget}MB")
+            set_param("memory_max_size", memory_budget)
 
         # Solver
         self.s = Solver()
+        # if set, property constraints are only enforced when this literal is assumed (see check_properties)
+        self.property_guard = None
+        self.cancelled = False # set by interrupt
+
+        self.sat = False
+        self.status = None # one of "sat", "unsat", "unknown" and "budget_exhausted" once the search is done
+        self.pruned_seeds = 0
+        # how far the search got
+        self.seeds_total, self.seeds_tried, self.unknown_seeds = 0, 0, 0
+        self.deepest_iter = -1 # the last iteration that a check found satisfiable
+        self.converged_iter = None # the first iteration whose centers don't move anymore (if any)
+        try:
+            # Constraints that do not depend on the seed being tried are only asserted once; each seed
+            # is then tried in its own push/pop scope on top of them
+            self.create_variables()
+            # the presearch doesn't use the solver, so the base model (slow to build for large
+            # datasets) is only built if it finds nothing
+            if search and self.presearch_budget > 0 and self.presearch():
+                self.sat = True
+            else:
+                with self.profiler.phase("base_model", self.s):
+                    self.create_base_model()
+                if not search:
+                    return
+                if self.engine == "bmc":
+                    self.sat = self.solve_unrolled()
+                else:
+                    with self.profiler.phase("search"):
+                        self.sat = self.search_parallel() if self.jobs > 1 else self.search()
+                    if self.symmetry_breaking:
+                        print(f"Symmetry breaking pruned {self.pruned_seeds} candidate seeds")
+            self.status = "sat" if self.sat else ("unknown" if self.unknown_seeds > 0 else "unsat")
+        except UnknownException:
+            self.status = "unknown"
+        except BudgetExhaustedException:
+            self.status = "budget_exhausted"
+        except Z3Exception as e:
+            # z3 fails asserting constraints (rather than checking them) once it is out of memory
+            if "out of memory" not in str(e):
+                raise
+            self.status = "budget_exhausted"
+        if self.status == "unsat":
+            print("Unsat")
+        elif self.status != "sat":
+            report = self.report()
+            print(f"Search ended without a result ({self.status}) after {report['elapsed']:.1f}s: "
+                  f"{report['seeds_tried']}/{report['seeds_total']} seeds tried ({report['unknown_seeds']} inconclusive), "
+                  f"deepest iteration reached: {report['deepest_iter']}")
+
+    def create_variables(self):
+        """
+        (Re)creates the z3 variables for the datapoints, the initial centers and the center assigned
+        to each point in each iteration. create_model replaces these with concrete values as it
+        goes, so this is called again before every seed that is tried. With the bmc engine, the
+        centers of every iteration are variables as well.
+        """
+        def create_centers(iter_num: int=0):
+            return [self.make_centers(f"c{axis_name(dim)}_{iter_num}", [Int(f"c{axis_name(dim)}_{center_num}_{iter_num}")
+                                                                     for center_num in range(self.num_centers)])
+                    for dim in range(self.dims)]
 
-        def create_initial_x_centers(iter_num: int=0):
-            cx = Array(f"cx_{iter_num}", IntSort(), IntSort())
-            for center_num in range(self.num_centers):
-                cx = Store(cx, center_num, Int(f"cx_{center_num}_{iter_num}"))
-            return cx
-        def create_initial_y_centers(iter_num: int=0):
-            cy = Array(f"cy_{iter_num}", IntSort(), IntSort())
-            for center_num in range(self.num_centers):
-                cy = Store(cy, center_num, Int(f"cy_{center_num}_{iter_num}"))
-            return cy
-
-        # center for some point
+        # center for some point (with the flat encoding: one indicator per center)
         def create_point_centers(iter_num: int):
-            return {i: Int(f"center_{i}_{iter_num}") for i in range(num_points)}
-
-        # look through relevant search space
-        flag = False
-        break_i = break_j = False
-        for i in range(-self.grid_limit, self.grid_limit + 1):
-            for j in range(-self.grid_limit, self.grid_limit + 1):
-                for k in range(self.num_points):
-                    self.points_x = {i: Int(f"px_{i}") for i in range(self.num_points)}
-                    self.points_y = {i: Int(f"py_{i}") for i in range(self.num_points)}
-                    self.centers_x = {0: create_initial_x_centers()} 
-                    self.centers_y = {0: create_initial_y_centers()}
-                    self.point_centers = {iter_num: create_point_centers(iter_num) for iter_num in range(self.num_iters)}
-                    try:
-                        self.s.push()
-                        self.s.add(self.points_x[k] == i)
-                        self.s.add(self.points_y[k] == j)
-                        self.create_model()
-                        flag = True
-                        break_i = True
-                        break_j = True
-                        break
-                    except UnsatException:
-                        self.s.pop()
-                if break_j:
-                    break
-            if break_i:
-                break
+            if self.encoding == "flat":
+                return {i: [Bool(f"center_{i}_{center_num}_{iter_num}") for center_num in range(self.num_centers)]
+                        for i in range(self.num_points)}
+            return {i: Int(f"center_{i}_{iter_num}") for i in range(self.num_points)}
 
-        if not flag:
-            print("Unsat")
+        # the coordinates of every point along each dimension (self.points[dim][point_num])
+        fixed_coords = [coords.tolist() for coords in self.fixed_points] # plain ints for z3
+        self.points = [{i: fixed_coords[dim][i] if i < self.num_fixed_points else Int(f"p{axis_name(dim)}_{i}")
+                        for i in range(self.num_points)} for dim in range(self.dims)]
+        symbolic_iters = range(self.num_iters) if self.engine == "bmc" else range(1)
+        # the coordinates of every center along each dimension, per iteration (self.centers[iter_num][dim])
+        self.centers = {iter_num: create_centers(iter_num) for iter_num in symbolic_iters}
+        # the variables are the same for every seed (only the values that replace them differ), and
+        # creating them is slow for many points, so they are only created once
+        if not hasattr(self, "point_center_vars"):
+            self.point_center_vars = {iter_num: create_point_centers(iter_num) for iter_num in range(self.num_iters)}
+        self.point_centers = {iter_num: dict(self.point_center_vars[iter_num]) for iter_num in range(self.num_iters)}
+        # plain int coordinates of each iteration's centers (in the same layout as self.centers),
+        # filled in as they are extracted
+        self.center_values = {}
+        if self.initial_centers is not None: # constants rather than variables that are constrained to them
+            self.set_center_values(0, [list(coords) for coords in self.initial_centers])
+        # distances between points and centers (see point_distances), which depend on the above
+        self.distance_cache = {}
+
+    def seed_candidates(self) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """
+        Yields the seeds tried by the search, in order, as (point_num, cell) tuples: each seed pins
+        the (symbolic) point with number point_num to the grid cell with the coordinates in cell.
+        With symmetry breaking enabled, seeds that are symmetric to an earlier one are pruned (see
+        count_seeds). If every point is fixed, seeds pin the first center to the cell instead, and
+        are (None, cell) tuples (or the only seed is (None, None), which pins nothing, if the
+        centers are initialized by some other strategy than "free"). There are
+        (2 * grid_limit + 1) ** dims cells, so the seeds are generated lazily rather than listed.
+        """
+        axis = range(-self.grid_limit, self.grid_limit + 1)
+        # in lexicographic order
+        cells = itertools.product(axis, repeat=self.dims)
+        num_free_points = self.num_points - self.num_fixed_points
+        if num_free_points == 0:
+            if self.init != "free":
+                yield None, None
+                return
+            # centers are interchangeable, so it is enough to try every cell for one of them
+            yield from ((None, cell) for cell in cells)
+            return
+        if not self.symmetry_breaking:
+            for cell in cells:
+                yield from ((k, cell) for k in range(self.num_fixed_points, self.num_points))
+            return
+        # symbolic points are ordered lexicographically, so the seed only has to place the smallest
+        # of them, and only in cells that are the smallest in their orbit under the grid's symmetries
+        # (the cells with sorted coordinates, which are also generated in lexicographic order)
+        if not self.symmetries_broken():
+            cells = itertools.combinations_with_replacement(axis, self.dims)
+        last_rank = len(axis) ** self.dims - num_free_points # leaves enough cells for the remaining points
+        for cell in cells:
+            if self.cell_key(cell) > last_rank:
+                return
+            yield self.num_fixed_points, cell
+
+    def count_seeds(self) -> int:
+        """
+        Returns how many seeds seed_candidates yields, without generating them, and stores how many
+        symmetry breaking pruned in self.pruned_seeds.
+        """
+        num_cells = (2 * self.grid_limit + 1) ** self.dims
+        num_free_points = self.num_points - self.num_fixed_points
+        if num_free_points == 0:
+            return 1 if self.init != "free" else num_cells
+        if not self.symmetry_breaking:
+            return num_cells * num_free_points
+        # the canonical cells, minus those among the last ones that leave too few cells after them
+        num_canonical = num_cells if self.symmetries_broken() else math.comb(2 * self.grid_limit + self.dims, self.dims)
+        too_late = range(max(num_cells - num_free_points + 1, 0), num_cells)
+        count = num_canonical - sum(self.is_canonical_cell(self.cell_at(rank)) for rank in too_late)
+        self.pruned_seeds = num_cells * num_free_points - count
+        return count
+
+    def cell_at(self, rank: int) -> Tuple[int, ...]:
+        """
+        Returns the coordinates of the grid cell at the provided position in lexicographic order (the
+        inverse of cell_key).
+        params:
+            rank: the position of the cell, between 0 and (2 * grid_limit + 1) ** dims - 1
+        """
+        coords = []
+        for _ in range(self.dims):
+            rank, digit = divmod(rank, 2 * self.grid_limit + 1)
+            coords.append(digit - self.grid_limit)
+        return tuple(reversed(coords))
+
+    def is_canonical_cell(self, cell: Tuple[int, ...]) -> bool:
+        """
+        Returns whether a grid cell is the (lexicographically) smallest one in its orbit under the
+        symmetries of the grid that map instances to instances: the permutations of the axes (ex: the
+        reflection along the diagonal in 2D), under which the smallest cell is the one with sorted
+        coordinates. The reflections and rotations that negate a coordinate are not included: the
+        center update rounds averages down, which doesn't commute with negation. Concrete initial
+        centers are fixed, so they break every symmetry of the grid, and so do fixed points (see
+        symmetries_broken).
+        params:
+            cell: the coordinates of the cell
+        """
+        return self.symmetries_broken() or list(cell) == sorted(cell)
+
+    def symmetries_broken(self) -> bool:
+        """
+        Returns whether concrete initial centers or fixed points break every symmetry of the grid
+        (see is_canonical_cell), so that every cell is canonical.
+        """
+        return self.initial_centers is not None or self.num_fixed_points > 0
+
+    def presearch(self) -> bool:
+        """
+        Looks for an instance by simulating batches of random inputs (see simulator.random_search)
+        for up to self.presearch_budget seconds, and prints how often each property was hit. Returns
+        whether or not an instance was found (in which case it is installed).
+        """
+        if 0 < self.num_fixed_points < self.num_points:
+            print("Presearch doesn't support a mix of fixed and symbolic points; falling back to the solver")
+            return False
+        if self.dims != 2:
+            print("Presearch only supports 2D points; falling back to the solver")
+            return False
+        if self.init != "free" and self.initial_centers is None:
+            print(f"Presearch doesn't support {self.init} initialization of symbolic points; falling back to the solver")
+            return False
+        initial_centers = self.initial_centers
+        points = self.fixed_points if self.num_fixed_points > 0 else None
+        with self.profiler.phase("presearch"):
+            trace, tried, hits = random_search(self.num_iters, self.num_points, self.num_centers, self.grid_limit, self.property,
+                                               self.presearch_budget, np.random.default_rng(self.seed), initial_centers,
+                                               sorted_points=self.symmetry_breaking, points=points, metric=self.metric)
+        print(f"Presearch (i={self.num_iters} p={self.num_points} c={self.num_centers} g={self.grid_limit}"
+              f"{f' {self.init} centers' if self.init != 'free' else ''}): {tried} candidates simulated")
+        for prop in AVAILABLE_PROPERTIES:
+            print(f"  {prop}: {hits[prop]} hits ({100 * hits[prop] / max(tried, 1):.3f}%)")
+        if trace is None:
+            print("Presearch found no instance; falling back to the solver")
+            return False
+        self.install_trace(*trace)
+        return True
+
+    def search(self) -> bool:
+        """
+        Looks through the relevant search space: tries each seed in turn until one of them leads
+        to a satisfiable instance. Returns whether or not an instance was found.
+        """
+        # every seed only adds constraints on top of the base model, so if the base model is
+        # already unsatisfiable there is no point in trying any of them
+        try:
+            if self.check() == unsat:
+                return False
+        except UnknownException: # inconclusive, but the seeds' checks may not be
+            pass
+        self.seeds_total = self.count_seeds()
+        for point_num, cell in self.seed_candidates():
+            if self.try_seed(point_num, cell):
+                return True
+        return False
 
+    def search_parallel(self) -> bool:
+        """
+        Same as search, but partitions the seeds across self.jobs worker processes (each with its own
+        solver), and installs the instance of the earliest seed that a worker found to lead to one.
+        Workers give up on seeds (interrupting their checks) that come after the earliest seed found to
+        lead to an instance so far. Whether a seed leads to an instance depends on the models that the
+        solver picks along the way, which depend on the seeds that it tried before, so this may find a
+        different seed (or instance) than search does, or none when search finds one.
+        """
+        self.seeds_total = self.count_seeds()
+        remaining = self.remaining_time()
+        config = dict(num_iters=self.num_iters, num_points=self.num_points, num_centers=self.num_centers,
+                      grid_limit=self.grid_limit, random_centers=self.random_centers, property=self.property,
+                      symmetry_breaking=self.symmetry_breaking, seed=self.seed, encoding=self.encoding,
+                      check_timeout=self.check_timeout, time_budget=remaining, points=self.fixed_points,
+                      metric=self.metric, dims=self.dims, init=self.init, init_centers=self.init_centers)
+        best_seed_index = multiprocessing.Value("q", self.seeds_total)
+        with multiprocessing.Pool(self.jobs, initializer=_init_search_worker, initargs=(best_seed_index,)) as pool:
+            results = pool.starmap(_search_worker, [(config, worker_num, self.jobs) for worker_num in range(self.jobs)])
+        for _, _, progress in results:
+            self.seeds_tried += progress["seeds_tried"]
+            self.unknown_seeds += progress["unknown_seeds"]
+            self.deepest_iter = max(self.deepest_iter, progress["deepest_iter"])
+        found = [(seed_index, trace) for seed_index, trace, _ in results if trace is not None]
+        if found:
+            _, trace = min(found)
+            self.install_trace(*trace)
+            return True
+        if any(progress["status"] == "budget_exhausted" for _, _, progress in results):
+            raise BudgetExhaustedException("Parallel search ran out of its budget")
+        return False
+
+    def try_seed(self, point_num: int, cell: Tuple[int, ...]) -> bool:
+        """
+        Tries to construct an instance in which the specified point is pinned to the provided cell (or
+        the first center, if point_num is None; or nothing, if cell is None as well).
+        Only the seed and the iteration specific constraints are added (in a new solver scope); the
+        scope is popped again if the seed doesn't lead to a satisfiable instance.
+        params:
+            point_num: the number of the point to pin (None to pin the first center)
+            cell: the coordinates to pin the point to
+        """
+        self.profiler.seed_tried()
+        self.seeds_tried += 1
+        self.create_variables()
+        self.s.push()
+        if point_num is not None:
+            self.s.add([coord == cell[dim] for dim, coord in enumerate(self.point_coords(point_num))])
+        elif cell is not None:
+            self.s.add([coord == cell[dim] for dim, coord in enumerate(self.center_coords(0, 0))])
+        try:
+            self.create_model()
+            return True
+        except UnsatException:
+            self.s.pop()
+            return False
+        except UnknownException: # inconclusive, so move on to the next seed (but don't report unsat)
+            self.unknown_seeds += 1
+            self.s.pop()
+            return False
+        except (BudgetExhaustedException, CancelledException):
+            self.s.pop()
+            raise
 
 
     ##### FUNCTIONS ENFORCING CONSTRAINTS ON SOLVER VARIABLES #####
     
     def points_within_grid(self):
         """
-        Ensures that all of the datapoints lie within the bounds of the defined grid
+        Ensures that all of the (symbolic) datapoints lie within the bounds of the defined grid
         """
-        for i in range(self.num_points):
-            self.s.add(And(self.points_x[i] >= -self.grid_limit, self.points_x[i] <= self.grid_limit))
-            self.s.add(And(self.points_y[i] >= -self.grid_limit, self.points_y[i] <= self.grid_limit))
+        for i in range(self.num_fixed_points, self.num_points):
+            self.check_deadline()
+            for coord in self.point_coords(i):
+                self.s.add(And(coord >= -self.grid_limit, coord <= self.grid_limit))
     
     def no_duplicate_points(self):
         """
-        Ensures that there are no duplicated datapoints (all datapoints should be unique)
+        Ensures that there are no duplicated datapoints (all datapoints should be unique). Fixed
+        points may be duplicates of each other (ex: in a real dataset), but symbolic points can't
+        duplicate any point. Expressed as a single Distinct over the points' cell keys (rather than
+        one constraint per pair of points).
         """
-        for i in range(self.num_points):
-            for j in range(i+1, self.num_points, 1):
-                px1, py1 = self.points_x[i], self.points_y[i]
-                px2, py2 = self.points_x[j], self.points_y[j]
-                self.s.add(Or(px1 != px2, py1 != py2))
+        keys = [self.cell_key(self.point_coords(i)) for i in range(self.num_fixed_points, self.num_points)]
+        # fixed points outside of the grid can't be duplicated by symbolic points (and their keys may
+        # collide with ones inside of it)
+        fixed_cells = {self.point_coords(i) for i in range(self.num_fixed_points)}
+        keys += sorted(self.cell_key(cell) for cell in fixed_cells if all(abs(coord) <= self.grid_limit for coord in cell))
+        if len(keys) > 1 and self.num_fixed_points < self.num_points:
+            self.s.add(Distinct(keys))
     
-    def assign_random_initial_centers(self):
+    def points_lexicographically_ordered(self):
         """
-        Ensures that the initial locations of the centers are based on a random assignment
+        Ensures that the (symbolic) datapoints are strictly sorted by their coordinates. Points
+        are interchangeable, so this only removes instances that are relabelings of each other (and it
+        also implies that there are no duplicated symbolic datapoints).
         """
-        iter_num = 0 # since we are only performing the random assignment for the initial configuration
-        for center_num in range(self.num_centers):
-            cx_var = Select(self.centers_x[iter_num], center_num)
-            cy_var = Select(self.centers_y[iter_num], center_num)
-            random_x = random.randint(-self.grid_limit, self.grid_limit)
-            random_y = random.randint(-self.grid_limit, self.grid_limit)
-            self.s.add(cx_var == random_x)
-            self.s.add(cy_var == random_y)
-    
+        # cell keys are in the same order as the coordinates, so one comparison per pair is enough
+        keys = [self.cell_key(self.point_coords(i)) for i in range(self.num_fixed_points, self.num_points)]
+        for key1, key2 in zip(keys, keys[1:]):
+            self.s.add(key1 < key2)
+
+    def choose_initial_centers(self) -> Tuple[List[int], ...]:
+        """
+        Returns the coordinates of the initial centers (one list per dimension) chosen by the
+        initialization strategy, or None if they can't be concrete: with the "free" strategy, or
+        with "farthest" and "kmeans++" while some datapoints are symbolic.
+        """
+        if self.init == "file":
+            if self.init_centers is None or len(self.init_centers) != self.dims:
+                raise ValueError(f"File initialization requires initial centers with {self.dims} coordinates")
+            if any(len(coords) != self.num_centers for coords in self.init_centers):
+                raise ValueError(f"{len(self.init_centers[0])} initial centers provided for {self.num_centers} centers")
+            if any(abs(int(coord)) > self.grid_limit for coords in self.init_centers for coord in coords):
+                raise ValueError(f"Initial centers provided outside of the grid (limit {self.grid_limit})")
+            return tuple([int(coord) for coord in coords] for coords in self.init_centers)
+        if self.init == "uniform":
+            return uniform_centers(self.num_centers, self.grid_limit, self.dims, self.rng)
+        if self.init in ("farthest", "kmeans++") and self.num_fixed_points == self.num_points:
+            strategy = farthest_point_centers if self.init == "farthest" else kmeans_plus_plus_centers
+            return strategy([coords.tolist() for coords in self.fixed_points], self.num_centers, self.rng, self.metric)
+        return None
+
+    def constrain_initial_centers(self):
+        """
+        Ensures that the (symbolic) initial centers are a possible outcome of the initialization
+        strategy on the (partly symbolic) datapoints. With "farthest", the first center is any of the
+        datapoints, and each next one a datapoint that is at least as far away from its closest
+        earlier center as every other datapoint. With "kmeans++", the centers are datapoints that are
+        all at a positive distance from each other, which is exactly when k-means++ has a nonzero
+        probability of sampling them.
+        """
+        points = [self.point_coords(point_num) for point_num in range(self.num_points)]
+        centers = [self.center_coords(center_num, 0) for center_num in range(self.num_centers)]
+
+        # distance from the provided location to the closest of the centers before center_num
+        def closest_earlier(coords: tuple, center_num: int):
+            closest = self.coords_distance(coords, centers[0])
+            for earlier in centers[1:center_num]:
+                dist = self.coords_distance(coords, earlier)
+                closest = If(dist < closest, dist, closest)
+            return closest
+
+        for center_num, center in enumerate(centers):
+            self.check_deadline()
+            self.s.add(Or([And([c == p for c, p in zip(center, point)]) for point in points]))
+            if self.init == "kmeans++":
+                self.s.add([Or([c != e for c, e in zip(center, earlier)]) for earlier in centers[:center_num]])
+            elif center_num > 0:
+                farthest = closest_earlier(center, center_num)
+                self.s.add([closest_earlier(point, center_num) <= farthest for point in points])
+
+    def fix_unambiguous_assignments(self, iter_num: int):
+        """
+        Once a point's coordinates and the centers (for the specified iteration) are concrete, the
+        center assigned to the point is already known unless several centers are equally close to
+        it, so it is stored as a plain int instead of a variable (and needs no constraints).
+        params:
+            iter_num: which iteration we are checking for
+        """
+        if iter_num not in self.center_values: # the centers are still symbolic
+            return
+        for point_num in range(self.num_points):
+            self.check_deadline()
+            dists = self.point_distances(point_num, iter_num)
+            if all(isinstance(dist, int) for dist in dists) and dists.count(min(dists)) == 1:
+                self.point_centers[iter_num][point_num] = dists.index(min(dists))
+
     def centers_within_grid(self, iter_num: int):
         """
         Ensures that all cluster centers (for the specified iteration number) lie within the bounds
@@ -117,20 +543,26 @@ class KMeans(object):
             iter_num: which iteration we are checking for
         """
         for i in range(self.num_centers):
-            self.s.add(And(Select(self.centers_x[iter_num], i) >= -self.grid_limit, Select(self.centers_x[iter_num], i) <= self.grid_limit))
-            self.s.add(And(Select(self.centers_y[iter_num], i) >= -self.grid_limit, Select(self.centers_y[iter_num], i) <= self.grid_limit))
+            for coord in self.center_coords(i, iter_num):
+                self.s.add(And(coord >= -self.grid_limit, coord <= self.grid_limit))
     
     def point_centers_are_valid_center_numbers(self, iter_num: int):
         """
         Ensures that the center numbers assigned to each point (depicting which center is closest
         to the point, and therefore, which center/cluster the point is assigned to) in the
         specified iteration is a valid center num (between 0 and self.num_centers - 1, inclusive).
+        With the flat encoding, exactly one of each point's center indicators has to be true instead.
         params:
             iter_num: which iteration we are checking for
         """
         for i in range(self.num_points):
             center_var = self.point_centers[iter_num][i]
-            self.s.add(And(center_var >= 0, center_var < self.num_centers))
+            if isinstance(center_var, int): # already known to be valid
+                continue
+            if self.encoding == "flat":
+                self.s.add(PbEq([(indicator, 1) for indicator in center_var], 1))
+            else:
+                self.s.add(And(center_var >= 0, center_var < self.num_centers))
     
     def points_have_closest_center(self, iter_num: int):
         """
@@ -139,219 +571,866 @@ class KMeans(object):
         params:
             iter_num: which iteration we are checking for
         """
+        # fixed points at the same location (ex: in a dataset) share their conditions
+        closest_by_location = {}
         for point_num in range(self.num_points):
+            self.check_deadline()
             center_num_var = self.point_centers[iter_num][point_num]
-            assigned_center_dist = self.distance(point_num, center_num_var, iter_num)
-            for center_num in range(self.num_centers):
-                dist = self.distance(point_num, center_num, iter_num)
-                self.s.add(assigned_center_dist <= dist)
+            if isinstance(center_num_var, int): # already known to be the closest
+                continue
+            dists = self.point_distances(point_num, iter_num)
+            if self.encoding == "flat":
+                location = self.point_coords(point_num)
+                if not all(isinstance(coord, int) for coord in location):
+                    location = point_num # symbolic, so not shared
+                if location not in closest_by_location:
+                    if all(isinstance(dist, int) for dist in dists):
+                        # the point and the centers are concrete: only the closest centers are possible
+                        closest_by_location[location] = [BoolVal(dist == min(dists)) for dist in dists]
+                    else:
+                        closest_by_location[location] = [And([dists[center_num] <= dist for other_num, dist in enumerate(dists)
+                                                              if other_num != center_num])
+                                                         for center_num in range(self.num_centers)]
+                # no symbolic index: each indicator implies that its center is (one of) the closest
+                for center_num, is_closest in enumerate(closest_by_location[location]):
+                    if is_false(is_closest):
+                        self.s.add(Not(center_num_var[center_num]))
+                    elif not is_true(is_closest):
+                        self.s.add(Implies(center_num_var[center_num], is_closest))
+                continue
+            if all(isinstance(dist, int) for dist in dists):
+                self.s.add(Or([center_num_var == center_num for center_num, dist in enumerate(dists) if dist == min(dists)]))
+                continue
+            # the assigned center's distance is picked from the terms that it is compared with (rather
+            # than built again by looking the center up in the arrays)
+            assigned_center_dist = dists[-1]
+            for center_num in reversed(range(self.num_centers - 1)):
+                assigned_center_dist = If(center_num_var == center_num, dists[center_num], assigned_center_dist)
+            self.s.add(And([assigned_center_dist <= dist for dist in dists]))
 
-    def create_model(self):
+    def centers_correctly_updated(self, iter_num: int):
+        """
+        Ensures that the centers in the specified iteration are the (rounded down) averages of the
+        points assigned to them in the previous iteration, or stay in the same position if no points
+        were assigned to them. Used by the bmc engine, where centers are symbolic in every iteration.
+        params:
+            iter_num: which iteration's centers we are constraining (must be at least 1)
+        """
+        prev_iter = iter_num - 1
+        for center_num in range(self.num_centers):
+            self.check_deadline()
+            assigned = [self.is_assigned(point_num, center_num, prev_iter) for point_num in range(self.num_points)]
+            count = Sum([If(is_assigned, 1, 0) for is_assigned in assigned])
+            sums = [Sum([If(is_assigned, coords[point_num], 0) for point_num, is_assigned in enumerate(assigned)])
+                    for coords in self.points]
+            prev_center = self.center_coords(center_num, prev_iter)
+            next_center = self.center_coords(center_num, iter_num)
+
+            self.s.add(Implies(count == 0, And([next_coord == prev_coord for next_coord, prev_coord in zip(next_center, prev_center)])))
+            # the count can only take values between 1 and num_points otherwise; spelling out the
+            # division for each of them keeps the divisor constant (and the constraints linear)
+            for n in range(1, self.num_points + 1):
+                self.check_deadline()
+                self.s.add(Implies(count == n, And([bound for next_coord, total in zip(next_center, sums)
+                                                    for bound in (n * next_coord <= total, total < n * next_coord + n)])))
+
+    def create_base_model(self):
         """
-        Constructs model constraints across all iterations
+        Constructs the constraints that are shared by every seed tried during the search: the
+        iteration independent constraints, plus the constraints for the first iteration (which
+        only involve the symbolic points and initial centers).
         """
         ## Independent of iterations:
         self.points_within_grid() # All points are within the grid
-        self.no_duplicate_points() # No points are duplicates
-        if self.random_centers:
-            self.assign_random_initial_centers()
+        if self.symmetry_breaking:
+            self.points_lexicographically_ordered() # Points are sorted (so also not duplicates)...
+            if self.num_fixed_points > 0:
+                self.no_duplicate_points() # ...but they can still duplicate fixed points
+        else:
+            self.no_duplicate_points() # No points are duplicates
+        if self.init in ("farthest", "kmeans++") and self.initial_centers is None:
+            self.constrain_initial_centers()
+
+        ## First iteration:
+        self.add_iteration_constraints(0)
+
+    def add_iteration_constraints(self, iter_num: int):
+        """
+        Adds the constraints specific to the specified iteration (including the constraints for
+        the property being verified, if any)
+        params:
+            iter_num: which iteration we are adding constraints for
+        """
+        self.fix_unambiguous_assignments(iter_num)
+        self.centers_within_grid(iter_num) # All centers are within the grid
+        self.point_centers_are_valid_center_numbers(iter_num)
+        self.points_have_closest_center(iter_num)
+        self.add_property_constraints(iter_num, self.property)
+
+    def add_property_constraints(self, iter_num: int, property: str):
+        """
+        Adds the constraints for the provided property (if any) that are specific to the specified
+        iteration.
+        params:
+            iter_num: which iteration we are adding constraints for
+            property: which property to add constraints for
+        """
+        if property == "OVERLAP_CENTER_EACH_ITERATION":
+            self.overlap_centers(iter_num)
+        if property == "EMPTY_CENTER_EACH_ITERATION":
+            self.empty_center(iter_num)
+        if iter_num == self.num_iters - 1:
+            if property == "OVERLAP_CENTER":
+                self.overlap_centers_end()
+            if property == "EMPTY_CENTER":
+                self.empty_center_end()
 
-        ## Iteration specific properties:
+    def create_model(self):
+        """
+        Constructs model constraints across all iterations (on top of the base model constructed
+        by create_base_model). Stops early once the centers reach a fixpoint (see fill_converged_iterations).
+        """
+        self.converged_iter = None
         for iter_num in range(self.num_iters):
-            self.centers_within_grid(iter_num) # All centers are within the grid
-            self.point_centers_are_valid_center_numbers(iter_num)
-            self.points_have_closest_center(iter_num)
-            if self.property == "OVERLAP_CENTER_EACH_ITERATION":
-                self.overlap_centers(iter_num)
-            if self.property == "EMPTY_CENTER_EACH_ITERATION":
-                self.empty_center(iter_num)
-            if iter_num == self.num_iters - 1:
-                if self.property == "OVERLAP_CENTER":
-                    self.overlap_centers_end()
-                if self.property == "EMPTY_CENTER":
-                    self.empty_center_end()
-            temp_result = self.s.check()
-            if temp_result == sat:
+            if iter_num > 0: # the first iteration's constraints are part of the base model
+                with self.profiler.phase("constraints", self.s):
+                    self.add_iteration_constraints(iter_num)
+            temp_result = self.check(iter_num)
+            if temp_result != sat:
+                raise UnsatException("Impossible instance: UNSAT at an intermediate step!")
+            self.deepest_iter = max(self.deepest_iter, iter_num)
+
+            with self.profiler.phase("extraction", self.s):
+                # everything is evaluated against a single snapshot of the model
+                model = self.s.model()
 
                 ### Assigning the centers for the next iteration ###
-                # 1. extract point centers for this iteration
+                # 1. extract the initial centers (which lets assigned_center skip the model for fixed points)
+                if iter_num == 0 and 0 not in self.center_values:
+                    initial_centers = [self.center_coords(center_num, iter_num) for center_num in range(self.num_centers)]
+                    self.center_values[iter_num] = [self.evaluate_ints(model, [center[dim] for center in initial_centers])
+                                                    for dim in range(self.dims)]
+
+                # 2. extract point centers for this iteration
+                assigned = [self.assigned_center(model, point_num, iter_num) for point_num in range(self.num_points)]
+
+                # 3. extracting point coordinates
+                if iter_num == 0:
+                    points = [self.evaluate_ints(model, coords.values()) for coords in self.points]
+                    self.freeze_first_iteration(points, assigned)
+                    self.points = [{point_num: coords[point_num] for point_num in range(self.num_points)} for coords in points]
+                    # storing the values for iteration 0 centers
+                    # so that z3 doesn't 're-evaluate' in a manner that becomes inconsistent with the final result
+                    # which was happening when they were stored as z3 centers
+                    self.set_center_values(iter_num, self.center_values[iter_num])
+                else:
+                    points = [list(coords.values()) for coords in self.points]
+
                 pt_centers = {center_num: [] for center_num in range(self.num_centers)}
-                for point_num in range(self.num_points):
-                    center_num = self.s.model().evaluate(self.point_centers[iter_num][point_num])
-                    center_num = int(center_num.as_string())
+                for point_num, center_num in enumerate(assigned):
                     self.point_centers[iter_num][point_num] = center_num
                     assert (center_num in pt_centers) # shouldn't be an invalid center_num
                     pt_centers[center_num].append(point_num)
-                
-                # 2. extracting point x and y coordinates
-                if iter_num == 0:
-                    px, py = [], []
-                    for point_num in range(self.num_points):
-                        x = self.s.model().evaluate(self.points_x[point_num])
-                        px.append(int(x.as_string()))
-                        y = self.s.model().evaluate(self.points_y[point_num])
-                        py.append(int(y.as_string()))
-                    self.points_x = {point_num: px[point_num] for point_num in range(self.num_points)}
-                    self.points_y = {point_num: py[point_num] for point_num in range(self.num_points)}
-                else:
-                    px, py = list(self.points_x.values()), list(self.points_y.values())
-                
-                # 3. compute new center values
-                cx, cy = [], []
-                for center_num in range(self.num_centers):
-                    n = len(pt_centers[center_num])
-                    if n == 0: # keep the center in the same position
-                        x = self.s.model().evaluate(Select(self.centers_x[iter_num], center_num))
-                        cx.append(int(x.as_string()))
-                        y = self.s.model().evaluate(Select(self.centers_y[iter_num], center_num))
-                        cy.append(int(y.as_string()))
-                    else: # new center values based on point averages
-                        x_coords = [px[pt_num] for pt_num in pt_centers[center_num]]
-                        y_coords = [py[pt_num] for pt_num in pt_centers[center_num]]
-                        cx.append(sum(x_coords) // n)
-                        cy.append(sum(y_coords) // n)
-                
-                # storing the values for iteration 0 centers 
-                # so that z3 doesn't 're-evaluate' in a manner that becomes inconsistent with the final result
-                # which was happening when they were stored as z3 centers
-                if iter_num == 0:
-                    center_x = Array(f"cx_{iter_num}", IntSort(), IntSort())
-                    center_y = Array(f"cy_{iter_num}", IntSort(), IntSort())
+
+                # 4. compute new center values
+                centers = []
+                for dim in range(self.dims):
+                    coords = []
                     for center_num in range(self.num_centers):
-                        x = self.s.model().evaluate(Select(self.centers_x[iter_num], center_num))
-                        center_x = Store(center_x, center_num, int(x.as_string()))
-                        y = self.s.model().evaluate(Select(self.centers_y[iter_num], center_num))
-                        center_y = Store(center_y, center_num, int(y.as_string()))
-                    self.centers_x[iter_num] = center_x
-                    self.centers_y[iter_num] = center_y
-
-                # 4. update the values of self.centers_x and self.centers_y
-                center_x = Array(f"cx_{iter_num+1}", IntSort(), IntSort())
-                center_y = Array(f"cy_{iter_num+1}", IntSort(), IntSort())
-                for center_num in range(self.num_centers):
-                    center_x = Store(center_x, center_num, cx[center_num])
-                    center_y = Store(center_y, center_num, cy[center_num])
-                self.centers_x[iter_num+1] = center_x
-                self.centers_y[iter_num+1] = center_y
-            else:
-                raise UnsatException("Impossible instance: UNSAT at an intermediate step!")
-    
-    def run(self):
+                        n = len(pt_centers[center_num])
+                        if n == 0: # keep the center in the same position
+                            coords.append(self.center_values[iter_num][dim][center_num])
+                        else: # new center values based on point averages
+                            coords.append(sum(points[dim][pt_num] for pt_num in pt_centers[center_num]) // n)
+                    centers.append(coords)
+
+                # 5. update the values of self.centers (and self.center_values)
+                self.set_center_values(iter_num+1, centers)
+
+                # 6. once the centers stop moving, every later iteration is the same as this one
+                if iter_num < self.num_iters - 1 and centers == self.center_values[iter_num]:
+                    self.converged_iter = iter_num
+                    self.fill_converged_iterations(iter_num)
+                    return
+
+    def fill_converged_iterations(self, iter_num: int):
+        """
+        Fills in the iterations after the specified one, in which the centers reached a fixpoint,
+        without any more constraints or checks: each of them has the same centers, and keeps the same
+        assignment of points (which the property constraints of the specified iteration were already
+        checked against). The end-of-run property is evaluated on the plain ints instead; raises
+        UnsatException if it doesn't hold.
+        params:
+            iter_num: the iteration whose recomputed centers are the same as its own (before the last one)
+        """
+        last_iter = self.num_iters - 1
+        for later_iter in range(iter_num + 1, self.num_iters):
+            self.set_center_values(later_iter, self.center_values[iter_num])
+            self.point_centers[later_iter] = dict(self.point_centers[iter_num])
+
+        if self.property == "OVERLAP_CENTER":
+            centers = list(zip(*self.center_values[last_iter]))
+            if len(set(centers)) == len(centers):
+                raise UnsatException("Impossible instance: the centers converged without overlapping")
+        if self.property == "EMPTY_CENTER":
+            # the last assignment doesn't move any centers, so points may switch to any of their closest centers
+            distances = [self.point_distances(point_num, last_iter) for point_num in range(self.num_points)]
+            closest = [[center_num for center_num, d in enumerate(dists) if d == min(dists)] for dists in distances]
+            empty = next((center_num for center_num in range(self.num_centers)
+                          if all(candidates != [center_num] for candidates in closest)), None)
+            if empty is None:
+                raise UnsatException("Impossible instance: the centers converged without an empty center")
+            for point_num, candidates in enumerate(closest):
+                if self.point_centers[last_iter][point_num] == empty:
+                    self.point_centers[last_iter][point_num] = next(c for c in candidates if c != empty)
+        self.deepest_iter = max(self.deepest_iter, last_iter)
+
+    def solve_unrolled(self) -> bool:
+        """
+        Bounded model checking engine: constrains every iteration (including the center updates
+        between them) symbolically on top of the base model and checks the whole trace at once.
+        Unlike the incremental search, this is complete: if it returns False, there is no instance.
+        """
+        with self.profiler.phase("constraints", self.s):
+            self.add_unrolled_constraints()
+        if self.check() != sat:
+            return False
+        self.deepest_iter = self.num_iters - 1
+
+        # store the instance in the same way that create_model does
+        with self.profiler.phase("extraction"):
+            self.install_trace(*self.extract_unrolled_trace(self.s.model()))
+        return True
+
+    def add_unrolled_constraints(self):
+        """
+        Adds the constraints for every iteration after the first (which is part of the base model),
+        including the center updates between them, for the bmc engine.
+        """
+        for iter_num in range(1, self.num_iters):
+            self.add_iteration_constraints(iter_num)
+            self.centers_correctly_updated(iter_num)
+
+    def extract_unrolled_trace(self, model: ModelRef):
+        """
+        Returns the instance in the provided model of the bmc constraints as plain python ints (in the
+        layout returned by concrete_trace).
+        params:
+            model: the model to evaluate in
+        """
+        points = [self.evaluate_ints(model, coords.values()) for coords in self.points]
+        centers = [[self.evaluate_ints(model, [self.center_coords(center_num, iter_num)[dim] for center_num in range(self.num_centers)])
+                    for iter_num in range(self.num_iters)] for dim in range(self.dims)]
+        pt_centers = [[self.assigned_center(model, point_num, iter_num) for point_num in range(self.num_points)]
+                      for iter_num in range(self.num_iters)]
+        return (*points, *centers, pt_centers)
+
+    def enumerate_instances(self, path: str, max_instances: int = None) -> dict:
+        """
+        AllSAT mode (bmc engine only): instead of stopping at the first instance, keeps checking the
+        same solver, blocking each instance found so that the next check has to find a different one.
+        Instances are distinct in their (symbolic) datapoints and initial centers, which determine the
+        rest of the trace (up to ties between equally close centers, which aren't enumerated). Each
+        instance is written to path as one JSON line as soon as it is found, after a header line with the
+        parameters of the run (see metadata and traces.read_jsonl_metadata). Stops when there are no
+        instances left, after max_instances of them, or when the time budget runs out. Returns the
+        number of instances found, whether they are all of them, and the throughput.
+        params:
+            path: the JSON lines file to write the instances to
+            max_instances: how many instances to stop after (all of them if not provided)
+        """
+        if self.engine != "bmc":
+            raise ValueError("Enumerating instances requires the bmc engine")
+        # the blocking clauses only mention these (fixed points and random centers are constants)
+        projection = [coord for point_num in range(self.num_fixed_points, self.num_points)
+                      for coord in self.point_coords(point_num)]
+        projection += [coord for center_num in range(self.num_centers) for coord in self.center_coords(center_num, 0)]
+
+        count, complete = 0, False
+        with open(path, "w") as f:
+            f.write(jsonl_header(self.metadata()))
+            try:
+                with self.profiler.phase("constraints", self.s):
+                    self.add_unrolled_constraints()
+                while max_instances is None or count < max_instances:
+                    if self.check() != sat:
+                        complete = True
+                        break
+                    with self.profiler.phase("extraction"):
+                        model = self.s.model()
+                        trace = self.extract_unrolled_trace(model)
+                        values = self.evaluate_ints(model, projection)
+                    f.write(json.dumps(dict(zip(self.trace_names(), trace))) + "\n")
+                    f.flush() # so that instances can be read while the enumeration is still running
+                    count += 1
+                    with self.profiler.phase("blocking", self.s):
+                        self.s.add(Or([var != value for var, value in zip(projection, values)]))
+            except (UnknownException, BudgetExhaustedException) as e:
+                print(f"Enumeration stopped early: {e}")
+        self.sat = count > 0
+        self.status = "sat" if count > 0 else ("unsat" if complete else "unknown")
+
+        elapsed = time.perf_counter() - self.start_time
+        summary = {"instances": count, "complete": complete, "elapsed": elapsed,
+                   "throughput": count / elapsed if elapsed > 0 else 0.0}
+        print(f"Found {count} instances{' (all of them)' if complete else ''} in {elapsed:.2f}s "
+              f"({summary['throughput']:.2f} instances/s), written to {path}")
+        return summary
+
+    def check_properties(self, properties: List[str]) -> dict:
+        """
+        Multi-property mode (bmc engine only): answers several properties in a single solver session.
+        The k-means trace is constrained once, each property's constraints are added behind their own
+        Boolean literal (so they only apply when it is assumed), and each property is then checked by
+        assuming its literal; the solver keeps what it learned about the trace from one check to the
+        next. Returns the result ("sat", "unsat", "unknown" or "budget_exhausted"), check time and
+        instance (if any, in the layout returned by concrete_trace) per property, and prints them.
+        The model has to be created without a property (property=None), since that one would be
+        asserted unguarded and apply to every check.
+        params:
+            properties: which properties to check
+        """
+        if self.engine != "bmc":
+            raise ValueError("Checking several properties requires the bmc engine")
+        if self.property is not None:
+            raise ValueError(f"Checking several properties requires a model without a property, not {self.property}")
+        for property in properties:
+            if property not in AVAILABLE_PROPERTIES:
+                raise ValueError(f"Unrecognized property provided; must be one of {AVAILABLE_PROPERTIES}")
+        literals = {}
+        try:
+            with self.profiler.phase("constraints", self.s):
+                self.add_unrolled_constraints() # without any property (self.property is None)
+                for property in properties:
+                    literals[property] = self.property_guard = Bool(f"check_{property}")
+                    for iter_num in range(self.num_iters):
+                        self.add_property_constraints(iter_num, property)
+        except BudgetExhaustedException as e: # every check below runs out of the budget as well
+            print(f"Constructing the trace stopped early: {e}")
+        self.property_guard = None
+
+        results = {}
+        for property in properties:
+            start = time.perf_counter()
+            try:
+                if property not in literals: # the budget ran out before its constraints were added
+                    raise BudgetExhaustedException("Out of time")
+                result = str(self.check(assumptions=[literals[property]]))
+            except UnknownException:
+                result = "unknown"
+            except BudgetExhaustedException:
+                result = "budget_exhausted"
+            elapsed = time.perf_counter() - start
+            instance = None
+            if result == "sat":
+                with self.profiler.phase("extraction"):
+                    instance = self.extract_unrolled_trace(self.s.model())
+            results[property] = {"result": result, "time": elapsed, "instance": instance}
+
+        print(f"{'property':>30} {'result':>16} {'time (s)':>9}")
+        for property, outcome in results.items():
+            print(f"{property:>30} {outcome['result']:>16} {outcome['time']:>9.3f}")
+        print(f"Total: {time.perf_counter() - self.start_time:.3f}s (including constructing the trace once)")
+        return results
+
+    def check(self, iter_num: int = None, assumptions: list = ()):
+        """
+        Checks the solver, within the per-check timeout and whatever is left of the time budget.
+        Returns sat or unsat; raises UnknownException if the check is inconclusive,
+        BudgetExhaustedException if the time or memory budget has run out, and CancelledException if the
+        check was interrupted (see _search_worker).
+        params:
+            iter_num: which iteration the check is for (None if it isn't for a single iteration)
+            assumptions: Boolean literals that only hold for this check
+        """
+        self.check_deadline()
+        if self.cancelled:
+            raise CancelledException("Search interrupted")
+        remaining = self.remaining_time()
+        timeout = min([limit for limit in (self.check_timeout, remaining) if limit is not None], default=None)
+        if timeout is not None:
+            self.s.set("timeout", max(1, int(timeout * 1000))) # in milliseconds
+        result = self.profiler.check(self.s, iter_num, assumptions)
+        if result == unknown:
+            reason = self.s.reason_unknown()
+            remaining = self.remaining_time()
+            if reason == "out of memory" or (remaining is not None and remaining <= 0):
+                raise BudgetExhaustedException(f"Out of budget: {reason}")
+            if self.cancelled: # z3 reports timeouts as "canceled" as well, so the reason doesn't tell
+                raise CancelledException("Check interrupted")
+            raise UnknownException(f"Inconclusive check: {reason}")
+        return result
+
+    def interrupt(self):
+        """
+        Interrupts the check that is running (called from another thread), which then raises
+        CancelledException, as every later check does.
+        """
+        self.cancelled = True
+        self.s.interrupt()
+
+    def check_deadline(self):
+        """
+        Raises BudgetExhaustedException if the time budget has run out. Besides before every check,
+        this is called while the constraints are built, which takes a while for many points.
+        """
+        remaining = self.remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise BudgetExhaustedException("Out of time")
+
+    def remaining_time(self):
+        """
+        Returns how much of the time budget (in seconds) is left, or None if there is no time budget.
+        """
+        return self.deadline - time.perf_counter() if self.deadline is not None else None
+
+    def report(self) -> dict:
+        """
+        Returns the outcome of the search ("sat", "unsat", "unknown" if some checks were inconclusive,
+        or "budget_exhausted") and how far it got.
+        """
+        return {"status": self.status, "elapsed": time.perf_counter() - self.start_time, "seeds_tried": self.seeds_tried,
+                "seeds_total": self.seeds_total, "unknown_seeds": self.unknown_seeds, "deepest_iter": self.deepest_iter,
+                "converged_iter": self.converged_iter}
+
+    def freeze_first_iteration(self, points: List[List[int]], assigned: List[int]):
+        """
+        Pins the first iteration's symbolic variables (datapoints, initial centers and point centers)
+        to the values extracted from the model. The checks for later iterations then don't have to
+        solve for them again, and can't pick values that are inconsistent with the extracted trace.
+        params:
+            points: the extracted point coordinates (one list per dimension)
+            assigned: the extracted center number of each point
+        """
+        for point_num in range(self.num_points):
+            if point_num >= self.num_fixed_points:
+                self.s.add([coord == points[dim][point_num] for dim, coord in enumerate(self.point_coords(point_num))])
+            self.s.add(self.is_assigned(point_num, assigned[point_num], 0))
+        for center_num in range(self.num_centers):
+            self.s.add([coord == self.center_values[0][dim][center_num]
+                        for dim, coord in enumerate(self.center_coords(center_num, 0))])
+
+    def concrete_trace(self):
+        """
+        Returns the instance that was found as plain python ints: the point coordinates (one list
+        per dimension), the center coordinates in each iteration (one list of lists per dimension)
+        and the center assigned to each point in each iteration, in a single tuple (in the same
+        layout as evaluate_model_vars; ex: px, py, cx, cy, pt_centers in 2D).
+        """
+        points = [list(coords.values()) for coords in self.points]
+        centers = [[list(self.center_values[iter_num][dim]) for iter_num in range(self.num_iters)] for dim in range(self.dims)]
+        pt_centers = [list(self.point_centers[iter_num].values()) for iter_num in range(self.num_iters)]
+        return (*points, *centers, pt_centers)
+
+    def trace_names(self) -> List[str]:
+        """
+        Returns the names of the parts of a trace, in the layout returned by concrete_trace (ex: px,
+        py, cx, cy and pt_centers in 2D).
+        """
+        return trace_names(self.dims)
+
+    def install_trace(self, *trace):
+        """
+        Stores an instance that was found elsewhere (e.g. by a worker process) in the same way that
+        create_model stores the instance it finds.
+        params:
+            trace: the instance, in the layout returned by concrete_trace
+        """
+        points, centers, pt_centers = trace[:self.dims], trace[self.dims:2 * self.dims], trace[2 * self.dims]
+        self.points = [{point_num: coords[point_num] for point_num in range(self.num_points)} for coords in points]
+        for iter_num in range(self.num_iters):
+            self.set_center_values(iter_num, [coords[iter_num] for coords in centers])
+            self.point_centers[iter_num] = {point_num: pt_centers[iter_num][point_num] for point_num in range(self.num_points)}
+        self.converged_iter = next((iter_num for iter_num in range(self.num_iters - 1)
+                                    if np.array_equal(self.center_values[iter_num + 1], self.center_values[iter_num])), None)
+
+    def run(self, export_path: str = None, trace_path: str = None):
         """
         Runs the model whose constraints have been defined by previously calling the create_model
         function. Checks if the result is satisfiable; if it is, evaluates model variables and
         runs the visualization script.
+        params:
+            export_path: if provided, the visualization is written to this file (see Visualizer.export)
+                         instead of being displayed
+            trace_path: if provided, the instance is written to this .npz file (see traces.save_trace),
+                        from which replay.py can show it again without solving
         """
-        px, py, cx, cy, pt_centers = self.evaluate_model_vars()
-        # Visualize instance:
-        visualizer = Visualizer(self.num_iters, self.num_points, self.num_centers, self.grid_limit, px, py, cx, cy, pt_centers)
-        visualizer.visualize()
+        trace = self.evaluate_model_vars()
+        if trace_path is not None:
+            save_trace(trace_path, trace, self.dims, self.metadata())
+            print(f"Trace written to {trace_path}")
+        # Visualize instance (the visualization is 2D, so it only shows the first two dimensions):
+        visualizer = Visualizer.from_trace(trace, self.dims, self.grid_limit)
+        if export_path is not None:
+            visualizer.export(export_path)
+        else:
+            visualizer.visualize()
     
-    def evaluate_model_vars(self):
+    def metadata(self) -> dict:
         """
-        Evaluates the model's variables: evaluates all the z3 variables associated with some satisfiable
-        instance and organizes values into datastructures that can be fed into the visualization script
+        Returns the parameters of the run (and how its instance came about), which are stored along
+        with the traces it writes.
         """
-        px, py = list(self.points_x.values()), list(self.points_y.values())
-        print("px:", px)
-        print("py:", py)
+        return {"num_iters": self.num_iters, "num_points": self.num_points, "num_centers": self.num_centers,
+                "grid_limit": self.grid_limit, "dims": self.dims, "property": self.property, "metric": self.metric,
+                "init": self.init, "seed": self.seed, "engine": self.engine, "encoding": self.encoding,
+                "num_fixed_points": self.num_fixed_points, "converged_iter": self.converged_iter}
 
-        cx, cy = [], [] # i-th row: i-th iteration; j-th column: j-th center's coordinates
-        for iter_num in range(self.num_iters):
-            x_coords, y_coords = [], [] # coordinates for this iteration
-            for center_num in range(self.num_centers):
-                x_coords.append(self.s.model().evaluate(Select(self.centers_x[iter_num], center_num)))
-                y_coords.append(self.s.model().evaluate(Select(self.centers_y[iter_num], center_num)))
-            cx.append(x_coords)
-            cy.append(y_coords)
-        print("cx:", cx)
-        print("cy:", cy)
-
-        pt_centers = [] # i-th row: i-th iteration; j-th column: center_num for j-th point
-        for iter_num in range(self.num_iters):
-            iter_centers = []
-            for point_num in range(self.num_points):
-                # iter_centers.append(self.s.model().evaluate(self.point_centers[iter_num][point_num]))
-                iter_centers.append(self.point_centers[iter_num][point_num])
-            pt_centers.append(iter_centers)
-        print("pt_centers:", pt_centers)
-        return px, py, cx, cy, pt_centers
+    def evaluate_model_vars(self):
+        """
+        Organizes the values of the instance that was found (all of which have already been extracted
+        from the solver's models as plain ints) into datastructures that can be fed into the
+        visualization script, and prints them
+        """
+        trace = self.concrete_trace()
+        # for centers, i-th row: i-th iteration; j-th column: j-th center's coordinate
+        # for pt_centers, i-th row: i-th iteration; j-th column: center_num for j-th point
+        for name, values in zip(self.trace_names(), trace):
+            print(f"{name}:", values)
+        if self.converged_iter is not None:
+            print(f"Converged at iteration {self.converged_iter} (the centers don't move after it)")
+        else:
+            print("Not converged: the centers are still moving at the last iteration")
+        return trace
     
-
     ##### HELPER FUNCTIONS #####
 
-    def distance(self, point_num: int, center_num, iter_num: int):
+    def make_centers(self, name: str, coords: list):
+        """
+        Stores the coordinates of every center along one axis (for one iteration) in the layout used
+        by the selected encoding: a z3 Array with the provided name, or a plain list.
+        params:
+            name: name of the z3 Array (only used by the array encoding)
+            coords: coordinate of each center (z3 expressions or ints)
+        """
+        if self.encoding == "flat":
+            return [coord if is_expr(coord) else IntVal(coord) for coord in coords]
+        centers = Array(name, IntSort(), IntSort())
+        for center_num, coord in enumerate(coords):
+            centers = Store(centers, center_num, coord)
+        return centers
+
+    def set_center_values(self, iter_num: int, values: List[List[int]]):
+        """
+        Stores the concrete coordinates of the centers in the specified iteration, both as plain ints
+        (in self.center_values) and in the layout used by the selected encoding (in self.centers).
+        params:
+            iter_num: which iteration the centers are for
+            values: the coordinates of every center, one list per dimension
+        """
+        self.center_values[iter_num] = values
+        self.centers[iter_num] = [self.make_centers(f"c{axis_name(dim)}_{iter_num}", coords) for dim, coords in enumerate(values)]
+
+    def point_coords(self, point_num: int) -> tuple:
+        """
+        Returns the coordinates (one per dimension) of the point with the provided point number.
+        params:
+            point_num: the number of the point
+        """
+        return tuple(coords[point_num] for coords in self.points)
+
+    def center_coords(self, center_num, iter_num: int) -> tuple:
+        """
+        Returns the coordinates (one per dimension) of the center with the provided center num in the
+        specified iteration.
+        params:
+            center_num: the number of the center (may only be a z3 variable with the array encoding)
+            iter_num: which iteration we are checking for
+        """
+        centers = self.centers[iter_num]
+        if isinstance(centers[0], list):
+            return tuple(coords[center_num] for coords in centers)
+        return tuple(Select(coords, center_num) for coords in centers)
+
+    def is_assigned(self, point_num: int, center_num: int, iter_num: int):
+        """
+        Returns a z3 boolean expression for whether the point with the provided point number is
+        assigned to the center with the provided center num in the specified iteration.
+        params:
+            point_num: the number of the point
+            center_num: the number of the center
+            iter_num: which iteration we are checking for
+        """
+        center_var = self.point_centers[iter_num][point_num]
+        if isinstance(center_var, int): # already extracted from a model
+            return BoolVal(center_var == center_num)
+        if isinstance(center_var, list): # flat encoding
+            return center_var[center_num]
+        return center_var == center_num
+
+    def evaluate_ints(self, model: ModelRef, exprs) -> List[int]:
+        """
+        Evaluates each of the provided integer expressions in the provided model, as plain ints.
+        params:
+            model: the model to evaluate in
+            exprs: the z3 integer expressions to evaluate (plain ints are returned as they are)
+        """
+        return [expr if isinstance(expr, int) else model.evaluate(expr, model_completion=True).as_long() for expr in exprs]
+
+    def assigned_center(self, model: ModelRef, point_num: int, iter_num: int) -> int:
+        """
+        Returns the number of the center that the point with the provided point number is assigned
+        to (in the specified iteration) in the provided model.
+        params:
+            model: the model to evaluate in
+            point_num: the number of the point
+            iter_num: which iteration we are checking for
+        """
+        center_var = self.point_centers[iter_num][point_num]
+        if isinstance(center_var, int): # already known
+            return center_var
+        dists = self.point_distances(point_num, iter_num)
+        if all(isinstance(dist, int) for dist in dists) and dists.count(min(dists)) == 1:
+            return dists.index(min(dists)) # the only possible center, so no need to evaluate
+        if isinstance(center_var, list): # flat encoding
+            for center_num, indicator in enumerate(center_var):
+                if is_true(model.evaluate(indicator, model_completion=True)):
+                    return center_num
+        return model.evaluate(center_var, model_completion=True).as_long()
+
+    def cell_key(self, point: tuple):
+        """
+        Returns a single number identifying the grid cell of a point (within the grid): its
+        coordinates, shifted to start at 0, as the digits of a number in base 2 * grid_limit + 1 (ex:
+        (x + grid_limit) * (2 * grid_limit + 1) + (y + grid_limit) in 2D). Cells have different keys,
+        and keys are in the same order as (lexicographically sorted) coordinates.
+        params:
+            point: the coordinates of the point (z3 expressions or ints)
+        """
+        key = 0
+        for coord in point:
+            key = key * (2 * self.grid_limit + 1) + (coord + self.grid_limit)
+        return key
+
+    def point_distances(self, point_num: int, iter_num: int) -> list:
+        """
+        Returns the distance between the point with the provided point number and every center (see
+        distance), in the specified iteration. They are only built once per iteration (and again once
+        the centers are concrete), and shared by every constraint and extraction that uses them.
+        params:
+            point_num: the number of the point
+            iter_num: which iteration we are checking for
+        """
+        key = (iter_num, iter_num in self.center_values, point_num)
+        if key not in self.distance_cache:
+            if point_num < self.num_fixed_points and iter_num in self.center_values:
+                # every fixed point's distances are computed at once (rather than point by point)
+                for fixed_num, dists in enumerate(self.fixed_point_distances(iter_num).tolist()):
+                    self.distance_cache[(iter_num, True, fixed_num)] = dists
+            else:
+                self.distance_cache[key] = [self.distance(point_num, center_num, iter_num)
+                                            for center_num in range(self.num_centers)]
+        return self.distance_cache[key]
+
+    def fixed_point_distances(self, iter_num: int) -> np.ndarray:
+        """
+        Computes the distances (in the same way as distance) between every fixed point and every
+        center, once the centers of the specified iteration are concrete, with numpy.
+        params:
+            iter_num: which iteration we are checking for
+        returns:
+            an array of shape (num_fixed_points, num_centers)
+        """
+        points = np.stack(self.fixed_points, axis=-1)[:, None, :]
+        centers = np.array(self.center_values[iter_num], dtype=np.int64).T[None, :, :]
+        if self.metric == "l2sq":
+            return (centers * centers - 2 * points * centers).sum(axis=-1)
+        abs_diffs = np.abs(points - centers)
+        return abs_diffs.max(axis=-1) if self.metric == "linf" else abs_diffs.sum(axis=-1)
+
+    def coords_distance(self, a: tuple, b: tuple):
+        """
+        Computes the full distance (in the selected metric; for l2sq, including every squared term)
+        between two locations with symbolic coordinates, ex: a datapoint and a center that are both
+        symbolic.
+        params:
+            a, b: the coordinates of the locations (one per dimension)
+        """
+        if self.metric == "l2sq":
+            return Sum([(x - y) * (x - y) for x, y in zip(a, b)])
+        abs_diffs = [Abs(x - y) for x, y in zip(a, b)]
+        if self.metric == "linf":
+            dist = abs_diffs[0]
+            for abs_diff in abs_diffs[1:]:
+                dist = If(abs_diff > dist, abs_diff, dist)
+            return dist
+        return Sum(abs_diffs)
+
+    def distance(self, point_num: int, center_num: int, iter_num: int):
         """
-        Computes the l1 (Manhattan) distance between the point with the provided point number
+        Computes the distance (in the selected metric) between the point with the provided point number
         and the center with the provided center num (based on their positions in the specified
-        iteration).
+        iteration). If both positions are concrete, the distance is computed as a plain int.
+
+        Distances are only ever compared between the centers for the same point, so for l2sq, the
+        point's own sum of squared coordinates (which is the same for every center) is left out: what
+        remains, the sum of c^2 - 2 * p * c over the dimensions, is linear in the point's coordinates
+        once the centers are concrete (ex: every iteration after the first with the incremental
+        engine), rather than quadratic.
         params:
             point_num: the number of the point whose coordinates should be considered
             center_num: the number of the center whose coordinates should be considered
             iter_num: which iteration we are checking for 
         """
-        px, py = self.points_x[point_num], self.points_y[point_num]
-        cx, cy = Select(self.centers_x[iter_num], center_num), Select(self.centers_y[iter_num], center_num)
-        return Abs(px - cx) + Abs(py - cy)
+        point = self.point_coords(point_num)
+        if all(isinstance(coord, int) for coord in point) and iter_num in self.center_values:
+            center = [coords[center_num] for coords in self.center_values[iter_num]]
+            if self.metric == "l2sq":
+                return sum(c * c - 2 * p * c for p, c in zip(point, center))
+            if self.metric == "linf":
+                return max(abs(p - c) for p, c in zip(point, center))
+            return sum(abs(p - c) for p, c in zip(point, center))
+        center = self.center_coords(center_num, iter_num)
+        if self.metric == "l2sq":
+            return Sum([c * c - 2 * p * c for p, c in zip(point, center)])
+        # built once per dimension, and shared by the comparisons below (rather than rebuilt in each)
+        abs_diffs = [Abs(p - c) for p, c in zip(point, center)]
+        if self.metric == "linf":
+            dist = abs_diffs[0]
+            for abs_diff in abs_diffs[1:]:
+                dist = If(abs_diff > dist, abs_diff, dist)
+            return dist
+        return Sum(abs_diffs)
 
 
     ##### PROPERTY VERIFICATION FUNCTIONS #####
+    def add_property_constraint(self, *constraints):
+        """
+        Adds constraints for a property; while self.property_guard is set (see check_properties),
+        they only apply when it is assumed.
+        params:
+            constraints: the z3 boolean expressions to add
+        """
+        if self.property_guard is not None:
+            constraints = [Implies(self.property_guard, constraint) for constraint in constraints]
+        self.s.add(*constraints)
+
     def overlap_centers(self, iter_num: int):
         """
-        Adds constraints to check that at the end of the algorithm (after the last iteration), at
-        least 2 centers are at the same location (overlap)
+        Adds constraints to check that in the specified iteration, at least 2 centers are at the
+        same location (overlap). The pair of centers is the same in every iteration this is added for.
+        params:
+            iter_num: which iteration we are checking for
         """
+        if self.encoding == "flat":
+            # one selector per pair of centers instead of symbolic indices
+            selectors = {(i, j): Bool(f"overlap_{i}_{j}") for i in range(self.num_centers) for j in range(i+1, self.num_centers)}
+            self.add_property_constraint(PbEq([(selector, 1) for selector in selectors.values()], 1))
+            for (i, j), selector in selectors.items():
+                center_i, center_j = self.center_coords(i, iter_num), self.center_coords(j, iter_num)
+                self.add_property_constraint(Implies(selector, And([coord_i == coord_j for coord_i, coord_j in zip(center_i, center_j)])))
+            return
+
         i, j = Ints('i j')
-        self.s.add(And(i >= 0, i < self.num_centers))
-        self.s.add(And(j >= 0, j < self.num_centers))
-        self.s.add(i != j)
-
-        self.s.add(And(
-            Select(self.centers_x[iter_num], i) == Select(self.centers_x[iter_num], j),
-            Select(self.centers_y[iter_num], i) == Select(self.centers_y[iter_num], j))
-        )
+        self.add_property_constraint(And(i >= 0, i < self.num_centers))
+        self.add_property_constraint(And(j >= 0, j < self.num_centers))
+        self.add_property_constraint(i != j)
+
+        self.add_property_constraint(And([coord_i == coord_j for coord_i, coord_j in zip(self.center_coords(i, iter_num), self.center_coords(j, iter_num))]))
         
     def overlap_centers_end(self):
         """
-        Adds constraints to check that at each iteration of the algorithm, at least 2 centers are
-        at the same location (overlap)
+        Adds constraints to check that at the end of the algorithm (after the last iteration), at
+        least 2 centers are at the same location (overlap)
         """
-        i, j = Ints('i j')
-        self.s.add(And(i >= 0, i < self.num_centers))
-        self.s.add(And(j >= 0, j < self.num_centers))
-        self.s.add(i != j)
-
-        self.s.add(And(
-            Select(self.centers_x[self.num_iters - 1], i) == Select(self.centers_x[self.num_iters - 1], j),
-            Select(self.centers_y[self.num_iters - 1], i) == Select(self.centers_y[self.num_iters - 1], j))
-        )
+        self.overlap_centers(self.num_iters - 1)
     
     def empty_center(self, iter_num: int):
         """
-        Adds constraints to check that at the end of the algorithm (after the last iteration), at
-        least one center (at least one cluster) is assigned no datapoints
+        Adds constraints to check that in the specified iteration, at least one center (at least one
+        cluster) is assigned no datapoints
+        params:
+            iter_num: which iteration we are checking for
         """
+        # centers that points are already known to be assigned to can't be empty
+        known = {center_var for center_var in self.point_centers[iter_num].values() if isinstance(center_var, int)}
+        unknown_points = [point_num for point_num in range(self.num_points)
+                          if not isinstance(self.point_centers[iter_num][point_num], int)]
+        if self.encoding == "flat":
+            self.add_property_constraint(Or([And([Not(self.is_assigned(point_num, center_num, iter_num)) for point_num in unknown_points])
+                           for center_num in range(self.num_centers) if center_num not in known]))
+            return
+
         c_num = Int(f"empty_center_{iter_num}")
-        constraints = []
-        for point_num in range(self.num_points):
+        constraints = [c_num != center_num for center_num in known]
+        for point_num in unknown_points:
             constraints.append(self.point_centers[iter_num][point_num] != c_num)
-        self.s.add(And(c_num >= 0, c_num < self.num_centers))
-        self.s.add(And(constraints))
+        self.add_property_constraint(And(c_num >= 0, c_num < self.num_centers))
+        self.add_property_constraint(And(constraints))
         
     def empty_center_end(self):
         """
-        Adds constraints to check that at each iteration of the algorithm, at least one center (at
-        least one cluster) is assigned no datapoints
+        Adds constraints to check that at the end of the algorithm (after the last iteration), at
+        least one center (at least one cluster) is assigned no datapoints
         """
-        c_num = Int(f"empty_center_{self.num_iters - 1}")
-        constraints = []
-        for point_num in range(self.num_points):
-            constraints.append(self.point_centers[self.num_iters - 1][point_num] != c_num)
-        self.s.add(And(c_num >= 0, c_num < self.num_centers))
-        self.s.add(And(constraints))
+        self.empty_center(self.num_iters - 1)
+
+
+# index (into seed_candidates) of the earliest seed found to lead to an instance so far; shared
+# between the worker processes of a parallel search
+_best_seed_index = None
+# how often (in seconds) the workers of a parallel search check whether the seed they are trying is still needed
+CANCEL_POLL_INTERVAL = 0.05
+
+def _init_search_worker(best_seed_index):
+    global _best_seed_index
+    _best_seed_index = best_seed_index
+
+def _search_worker(config: dict, worker_num: int, jobs: int):
+    """
+    Searches every jobs-th seed, starting from seed number worker_num, in a fresh KMeans object.
+    Once another worker finds an earlier seed that leads to an instance, the seed being tried is
+    abandoned (its check is interrupted from a separate thread, since a check can't be polled).
+    Returns the index of the seed and the instance found (as plain ints), or None for both, along
+    with how far the worker got (see KMeans.report).
+    params:
+        config: the arguments for the KMeans constructor
+        worker_num: the number of this worker
+        jobs: the total number of workers
+    """
+    kmeans = KMeans(**config, search=False)
+    current_seed_index = -1 # the base model's check is always needed
+    done = threading.Event()
+    def cancel_outdated_seed():
+        while not done.wait(CANCEL_POLL_INTERVAL):
+            if current_seed_index > _best_seed_index.value:
+                kmeans.interrupt()
+    watcher = threading.Thread(target=cancel_outdated_seed, daemon=True)
+    watcher.start()
+    try:
+        try:
+            if kmeans.check() == unsat:
+                return None, None, kmeans.report()
+        except UnknownException: # as in search, the seeds are tried anyway
+            pass
+        seeds = itertools.islice(enumerate(kmeans.seed_candidates()), worker_num, None, jobs)
+        for current_seed_index, (point_num, cell) in seeds:
+            if current_seed_index > _best_seed_index.value: # an earlier seed already led to an instance
+                break
+            if kmeans.try_seed(point_num, cell):
+                with _best_seed_index.get_lock():
+                    _best_seed_index.value = min(_best_seed_index.value, current_seed_index)
+                kmeans.status = "sat"
+                return current_seed_index, kmeans.concrete_trace(), kmeans.report()
+    except UnknownException:
+        kmeans.unknown_seeds += 1
+    except BudgetExhaustedException:
+        kmeans.status = "budget_exhausted"
+    except CancelledException: # an earlier seed already led to an instance
+        pass
+    finally:
+        done.set()
+        watcher.join()
+    return None, None, kmeans.report()
 
 
-def main(num_iters: int, num_points: int, num_centers: int, grid_limit: int, random_centers: bool, property: str):
+def main(num_iters: int, num_points: int, num_centers: int, grid_limit: int, random_centers: bool, property: str,
+         symmetry_breaking: bool = False, jobs: int = 1, engine: str = "incremental", encoding: str = "array",
+         presearch_budget: float = 0, seed: int = None, profile_path: str = None, check_timeout: float = None,
+         time_budget: float = None, memory_budget: int = None, export_path: str = None,
+         points: Tuple[List[int], ...] = None, enumerate_path: str = None, max_instances: int = None,
+         metric: str = "l1", dims: int = 2, properties: List[str] = None, init: str = None,
+         init_centers: Tuple[List[int], ...] = None, trace_path: str = None):
     """
     main function that intantiates an object of the KMeans class and then runs the model.
     params:
@@ -359,9 +1438,46 @@ def main(num_iters: int, num_points: int, num_centers: int, grid_limit: int, ran
         num_points: number of datapoints
         num_centers: number of centers
         grid_limit: dimensions of the grid (ex: if the grid_limit is 5, then the coordinates go from
-                                            -5.0 to 5.0 along both axes)
-        random_centers: flag indicating whether or not to randomly initialize center coordinates (via constraints)
+                                            -5.0 to 5.0 along every axis)
+        random_centers: flag indicating whether or not to randomly initialize center coordinates (the same as init="uniform")
         property: which property to verify (if any)
+        symmetry_breaking: flag indicating whether or not to prune symmetric seeds and instances
+        jobs: number of worker processes to search with
+        engine: how to search for an instance ("incremental" or "bmc")
+        encoding: how centers and assignments are represented ("array" or "flat")
+        presearch_budget: how long (in seconds) to simulate random inputs before invoking the solver
+        seed: seed for the random center initialization (a random one is picked if not provided)
+        profile_path: if provided, where the search spends its time is printed and written to this JSON file
+        check_timeout: how long (in seconds) a single solver check may run for
+        time_budget: how long (in seconds) the whole search may run for
+        memory_budget: how much memory (in megabytes) z3 may use (at least MIN_MEMORY_BUDGET)
+        export_path: if provided, the visualization is written to this file instead of being displayed
+        points: concrete coordinates of the first datapoints, one list per dimension (the rest are symbolic)
+        enumerate_path: if provided, every instance (up to max_instances) is written to this JSON lines
+                        file instead of visualizing the first one (see KMeans.enumerate_instances)
+        max_instances: how many instances to enumerate at most
+        metric: the distance between points and centers ("l1", "l2sq" or "linf")
+        dims: number of coordinates of every datapoint and center
+        properties: if provided, these properties (rather than property) are all checked in a single
+                    solver session instead of visualizing an instance (see KMeans.check_properties)
+        init: how to initialize the centers (see KMeans)
+        init_centers: coordinates of the initial centers for init="file", one list per dimension
+        trace_path: .npz file to write the instance to (see KMeans.run)
     """
-    kmeans = KMeans(num_iters, num_points, num_centers, grid_limit, random_centers, property)
-    kmeans.run()
+    if properties is not None:
+        property = None # each of them is added behind its own literal instead
+    kmeans = KMeans(num_iters, num_points, num_centers, grid_limit, random_centers, property, symmetry_breaking, jobs, seed,
+                    engine=engine, encoding=encoding, presearch_budget=presearch_budget,
+                    search=enumerate_path is None and properties is None,
+                    profile=profile_path is not None, check_timeout=check_timeout, time_budget=time_budget,
+                    memory_budget=memory_budget, points=points, metric=metric, dims=dims, init=init,
+                    init_centers=init_centers)
+    if enumerate_path is not None:
+        kmeans.enumerate_instances(enumerate_path, max_instances)
+    if properties is not None:
+        kmeans.check_properties(properties)
+    if profile_path is not None:
+        kmeans.profiler.print_table()
+        kmeans.profiler.dump(profile_path)
+    if kmeans.sat and enumerate_path is None and properties is None: # there is nothing to visualize otherwise
+        kmeans.run(export_path, trace_path)
@@ -0,0 +1,157 @@
+import argparse
+import contextlib
+import io
+import time
+
+from z3 import Int, Optimize, Sum, sat
+
+from kmeans import KMeans
+from constants import AVAILABLE_ENCODINGS, AVAILABLE_PROPERTIES
+
+# the sizes that are minimized, in order of priority (the number of centers is part of the question)
+SIZES = ["num_points", "grid_limit", "num_iters"]
+
+def attempt(config: dict, check_timeout: float) -> KMeans:
+    """
+    Searches for an instance of a configuration with the bmc engine (which is complete, so an unsat
+    outcome means that the configuration can't reproduce the property). Returns the KMeans object;
+    its status is "unknown" if the check timed out.
+    params:
+        config: the KMeans arguments of the configuration
+        check_timeout: how long (in seconds) the check may run for
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # KMeans prints the instance it finds
+        kmeans = KMeans(**config, engine="bmc", check_timeout=check_timeout)
+    print(", ".join(f"{size}={config[size]}" for size in SIZES) + f": {kmeans.status} ({time.perf_counter() - start:.2f}s)",
+          flush=True)
+    return kmeans
+
+def fits(config: dict) -> bool:
+    """
+    Returns whether the grid of a configuration has room for all of its (distinct) datapoints.
+    params:
+        config: the KMeans arguments of the configuration
+    """
+    return (2 * config["grid_limit"] + 1) ** config["dims"] >= config["num_points"]
+
+def minimize(config: dict, lower_bounds: dict, check_timeout: float):
+    """
+    Looks for the smallest configuration that still reproduces the property: for each size in SIZES
+    in turn, tries every value from its lower bound up to its current value (keeping the other sizes
+    fixed), and keeps the first one with an instance. This is repeated until no size shrinks any
+    further, since a smaller grid (say) may allow fewer points. Returns the smallest configuration
+    and the KMeans object holding its instance, or None for both if the provided configuration has
+    no instance.
+    params:
+        config: the KMeans arguments of the configuration to start from
+        lower_bounds: the smallest value to try for each size
+        check_timeout: how long (in seconds) a single check may run for; a configuration whose check
+                       times out counts as not reproducing the property
+    """
+    kmeans = attempt(config, check_timeout)
+    if not kmeans.sat:
+        return None, None
+
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for size in SIZES:
+            for value in range(lower_bounds[size], config[size]):
+                candidate = {**config, size: value}
+                if not fits(candidate):
+                    continue
+                candidate_kmeans = attempt(candidate, check_timeout)
+                if candidate_kmeans.sat:
+                    config, kmeans, shrunk = candidate, candidate_kmeans, True
+                    break
+    return config, kmeans
+
+def minimize_spread(config: dict, check_timeout: float):
+    """
+    Looks for the instance of a configuration whose datapoints and initial centers are packed the
+    most tightly (the smallest sum of the widths of their bounding box along each dimension), with z3's
+    Optimize instead of a plain solver. Returns the KMeans object holding the instance, or None if the
+    optimization didn't finish in time.
+    params:
+        config: the KMeans arguments of the configuration
+        check_timeout: how long (in seconds) the optimization may run for
+    """
+    kmeans = KMeans(**config, engine="bmc", search=False)
+    kmeans.add_unrolled_constraints()
+    opt = Optimize()
+    opt.add(kmeans.s.assertions())
+    if check_timeout is not None:
+        opt.set("timeout", max(1, int(check_timeout * 1000))) # in milliseconds
+
+    coords = [kmeans.point_coords(point_num) for point_num in range(config["num_points"])]
+    coords += [kmeans.center_coords(center_num, 0) for center_num in range(config["num_centers"])]
+    widths = []
+    for dim in range(config["dims"]):
+        low, high = Int(f"min_{dim}"), Int(f"max_{dim}")
+        opt.add([bound for coord in coords for bound in (low <= coord[dim], coord[dim] <= high)])
+        widths.append(high - low)
+    opt.minimize(Sum(widths))
+    if opt.check() != sat:
+        return None
+    kmeans.install_trace(*kmeans.extract_unrolled_trace(opt.model()))
+    kmeans.sat, kmeans.status = True, "sat"
+    return kmeans
+
+if __name__ == '__main__':
+    """
+    Shrinks a configuration that reproduces a property down to the smallest one that still does,
+    and visualizes its instance.
+    """
+    parser = argparse.ArgumentParser("Minimize: smallest configuration of the k-Means model that reproduces a property")
+
+    parser.add_argument("-i", "--num_iters", default=5, type=int, help="Number of iterations to start from")
+    parser.add_argument("-p", "--num_points", default=10, type=int, help="Number of datapoints to start from")
+    parser.add_argument("-c", "--num_centers", default=3, type=int, help="Number of clusters (not minimized)")
+    parser.add_argument("-g", "--grid_limit", default=5, type=int, help="Grid limit to start from")
+    parser.add_argument("--dims", default=2, type=int, help="number of coordinates of every datapoint and center (not minimized)")
+    parser.add_argument("--random_centers", default=False, action="store_true",
+                        help="flag indicating whether or not to random initialize centers")
+    parser.add_argument("-prop", "--property", required=True, type=str,
+                        help=f"which property to reproduce; must be one of {AVAILABLE_PROPERTIES}")
+    parser.add_argument("--seed", default=0, type=int, help="seed for the random center initialization")
+    parser.add_argument("--symmetry_breaking", default=False, action="store_true",
+                        help="flag indicating whether or not to prune symmetric instances from the search")
+    parser.add_argument("--encoding", default="flat", type=str,
+                        help=f"how centers and assignments are represented; must be one of {AVAILABLE_ENCODINGS}")
+    parser.add_argument("--min_points", default=None, type=int,
+                        help="smallest number of datapoints to try (by default, the number of centers, since "
+                             "fewer points always leave a center empty)")
+    parser.add_argument("--min_grid_limit", default=0, type=int, help="smallest grid limit to try")
+    parser.add_argument("--min_iters", default=1, type=int, help="smallest number of iterations to try")
+    parser.add_argument("--check_timeout", default=None, type=float,
+                        help="how long (in seconds) a single check may run for before the configuration counts as "
+                             "not reproducing the property")
+    parser.add_argument("--optimize", default=False, action="store_true",
+                        help="flag indicating whether or not to also pack the smallest instance as tightly as possible")
+    parser.add_argument("--export", default=None, type=str,
+                        help="file to write the visualization to instead of displaying it")
+
+    args = parser.parse_args()
+    if args.property not in AVAILABLE_PROPERTIES:
+        raise ValueError(f"Unrecognized property provided; must be one of {AVAILABLE_PROPERTIES}")
+    if args.encoding not in AVAILABLE_ENCODINGS:
+        raise ValueError(f"Unrecognized encoding provided; must be one of {AVAILABLE_ENCODINGS}")
+
+    config = dict(num_iters=args.num_iters, num_points=args.num_points, num_centers=args.num_centers,
+                  grid_limit=args.grid_limit, random_centers=args.random_centers, property=args.property, seed=args.seed,
+                  symmetry_breaking=args.symmetry_breaking, encoding=args.encoding, dims=args.dims)
+    lower_bounds = dict(num_points=args.min_points if args.min_points is not None else args.num_centers,
+                        grid_limit=args.min_grid_limit, num_iters=args.min_iters)
+    config, kmeans = minimize(config, lower_bounds, args.check_timeout)
+    if kmeans is None:
+        print("The starting configuration doesn't reproduce the property (or its check timed out)")
+    else:
+        print("Smallest configuration: " + ", ".join(f"{size}={config[size]}" for size in SIZES))
+        if args.optimize:
+            optimized = minimize_spread(config, args.check_timeout)
+            if optimized is not None:
+                kmeans = optimized
+            else:
+                print("Optimization timed out; keeping the first instance found")
+        kmeans.run(args.export)
@@ -0,0 +1,126 @@
+import contextlib
+import json
+import time
+from collections import defaultdict
+
+from z3 import Solver
+
+class Profiler(object):
+    """
+    Records where a KMeans search spends its time: the wall time and number of solver assertions
+    added per phase (ex: constraint construction, checks, model extraction), every solver check
+    (with the iteration it was for, its result and z3's statistics after it) and the number of
+    seeds tried. A disabled profiler records nothing.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        params:
+            enabled: flag indicating whether or not to record anything
+        """
+        self.enabled = enabled
+        self.phase_times = defaultdict(float)
+        self.phase_calls = defaultdict(int)
+        self.phase_assertions = defaultdict(int)
+        self.checks = []
+        self.counters = {"conflicts": 0, "decisions": 0} # z3's running totals as of the previous check
+        self.seeds_tried = 0
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, solver: Solver = None):
+        """
+        Times the code run inside the context as (one more call of) the phase with the provided name.
+        params:
+            name: the name of the phase
+            solver: if provided, the number of assertions added to it inside the context is recorded too
+        """
+        if not self.enabled:
+            yield
+            return
+        num_assertions = len(solver.assertions()) if solver is not None else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+            self.phase_calls[name] += 1
+            if solver is not None:
+                self.phase_assertions[name] += len(solver.assertions()) - num_assertions
+
+    def check(self, solver: Solver, iter_num: int = None, assumptions: list = ()):
+        """
+        Runs solver.check() as part of the "check" phase, and records its result and z3's statistics.
+        Returns the result.
+        params:
+            solver: the solver to check
+            iter_num: which iteration the check is for (None if it isn't for a single iteration)
+            assumptions: Boolean literals that only hold for this check
+        """
+        if not self.enabled:
+            return solver.check(*assumptions)
+        start = time.perf_counter()
+        with self.phase("check"):
+            result = solver.check(*assumptions)
+        stats = solver.statistics()
+        stats = {key: stats.get_key_value(key) for key in stats.keys()}
+        check = {"iter_num": iter_num, "result": str(result), "time": time.perf_counter() - start, "statistics": stats}
+        # z3 keeps running totals of these across checks (until they are reset by a pop), so the
+        # ones for this check are the difference with the previous check
+        for key in self.counters:
+            total = stats.get(key, 0)
+            check[key] = total - self.counters[key] if total >= self.counters[key] else total
+            self.counters[key] = total
+        self.checks.append(check)
+        return result
+
+    def seed_tried(self):
+        """
+        Counts one more seed tried by the search.
+        """
+        self.seeds_tried += 1
+
+    def to_dict(self) -> dict:
+        """
+        Returns everything that was recorded, as plain (JSON serializable) values.
+        """
+        return {
+            "total_time": time.perf_counter() - self.start,
+            "seeds_tried": self.seeds_tried,
+            "phases": {name: {"time": self.phase_times[name], "calls": self.phase_calls[name],
+                              "assertions": self.phase_assertions[name]} for name in self.phase_times},
+            "checks": self.checks,
+        }
+
+    def dump(self, path: str):
+        """
+        Writes everything that was recorded to a JSON file.
+        params:
+            path: the file to write
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_table(self):
+        """
+        Prints the time spent per phase, and the time, conflicts, decisions and memory per iteration.
+        """
+        report = self.to_dict()
+        print(f"Total: {report['total_time']:.3f}s, {report['seeds_tried']} seeds tried")
+        print(f"{'phase':>12} {'calls':>7} {'time (s)':>9} {'assertions':>11}")
+        for name, phase in report["phases"].items():
+            print(f"{name:>12} {phase['calls']:>7} {phase['time']:>9.3f} {phase['assertions']:>11}")
+
+        # aggregate the checks per iteration (across seeds)
+        iters = defaultdict(lambda: {"checks": 0, "time": 0.0, "conflicts": 0, "decisions": 0, "memory": 0.0})
+        for check in self.checks:
+            row = iters["-" if check["iter_num"] is None else check["iter_num"]]
+            row["checks"] += 1
+            row["time"] += check["time"]
+            row["conflicts"] += check["conflicts"]
+            row["decisions"] += check["decisions"]
+            row["memory"] = max(row["memory"], check["statistics"].get("max memory", 0.0))
+        print(f"{'iteration':>12} {'checks':>7} {'time (s)':>9} {'conflicts':>10} {'decisions':>10} {'max mem (MB)':>13}")
+        for iter_num, row in iters.items():
+            print(f"{iter_num:>12} {row['checks']:>7} {row['time']:>9.3f} {row['conflicts']:>10} {row['decisions']:>10} "
+                  f"{row['memory']:>13.2f}")
@@ -0,0 +1,119 @@
+import argparse
+import os
+
+import numpy as np
+
+from constants import AVAILABLE_PROPERTIES
+from simulator import property_holds, validate_trace
+from traces import (arrays_trace, load_trace, load_traces, read_jsonl_metadata, read_jsonl_traces, save_traces, trace_at,
+                    trace_names)
+from visualizer import Visualizer
+
+def load(path: str, index: int = None):
+    """
+    Loads a trace without solving anything: from a .npz file written by KMeans.run, or the trace with
+    the provided index from a trace set directory written by save_traces (memory-mapped) or a JSON
+    lines file written by KMeans.enumerate_instances. Returns the trace (in the layout of
+    KMeans.concrete_trace) and the metadata of the run that produced it (if known).
+    params:
+        path: the file or directory to load from
+        index: which trace of a set to load
+    """
+    if os.path.isdir(path):
+        arrays, metadata = load_traces(path)
+        return trace_at(arrays, index or 0), metadata
+    if os.path.splitext(path)[1].lower() == ".npz":
+        return load_trace(path)
+    for trace_num, trace in enumerate(read_jsonl_traces(path)):
+        if trace_num == (index or 0):
+            return trace, read_jsonl_metadata(path)
+    raise IndexError(f"{path} holds fewer than {(index or 0) + 1} traces")
+
+def check_set(directory: str):
+    """
+    Checks every trace of a set (in a single vectorized pass over the memory-mapped arrays; only for 2D
+    traces): prints how many of them are valid runs of k-means (if the metric of the run is known), and
+    how many satisfy each property.
+    params:
+        directory: the trace set directory written by save_traces
+    """
+    arrays, metadata = load_traces(directory)
+    num_traces = metadata["num_traces"]
+    print(f"{num_traces} traces in {directory}")
+    if arrays["points"].shape[-1] != 2:
+        print("Only 2D traces are checked")
+        return
+    px, py, cx, cy, pt_centers = arrays_trace(arrays["points"], arrays["centers"], arrays["pt_centers"])
+    if "metric" in metadata:
+        valid = validate_trace(px, py, cx, cy, pt_centers, metadata["metric"])
+        print(f"  valid runs of k-means: {int(valid.sum())}")
+    else:
+        print("  valid runs of k-means: not checked (the metric of the run is unknown)")
+    for property in AVAILABLE_PROPERTIES:
+        print(f"  {property}: {int(property_holds(cx, cy, pt_centers, property).sum())}")
+
+def convert(path: str, directory: str):
+    """
+    Converts the JSON lines file written by KMeans.enumerate_instances into a trace set directory
+    (see save_traces), which can be memory-mapped rather than parsed line by line, along with the
+    metadata of its run (see traces.read_jsonl_metadata). The file is read twice (once to count the
+    traces), so it never has to fit in memory.
+    params:
+        path: the JSON lines file to read
+        directory: the trace set directory to write
+    """
+    num_traces = sum(1 for _ in read_jsonl_traces(path))
+    if num_traces == 0:
+        raise ValueError(f"{path} holds no traces")
+    dims = (len(next(read_jsonl_traces(path))) - 1) // 2
+    metadata = read_jsonl_metadata(path)
+    if not metadata:
+        print(f"{path} has no metadata header, so its traces can't be checked as runs of k-means")
+    save_traces(directory, read_jsonl_traces(path), num_traces, dims, {**metadata, "source": path, "dims": dims})
+    print(f"Wrote {num_traces} traces to {directory}")
+
+if __name__ == '__main__':
+    """
+    Shows a trace that was written by an earlier run again (printed, checked and visualized) without
+    re-solving it, or converts enumerated instances into a memory-mapped trace set.
+    """
+    parser = argparse.ArgumentParser("Replay: show a k-Means trace written by an earlier run")
+
+    parser.add_argument("trace", type=str,
+                        help=".npz file written by run.py --save_trace, trace set directory, or JSON lines file "
+                             "written by run.py --enumerate")
+    parser.add_argument("--index", default=None, type=int,
+                        help="which trace of a set (or JSON lines file) to show; by default, a whole set is checked "
+                             "instead (and the first trace of a JSON lines file is shown)")
+    parser.add_argument("--export", default=None, type=str,
+                        help="file to write the visualization to instead of displaying it")
+    parser.add_argument("--no_visualize", default=False, action="store_true",
+                        help="flag indicating whether or not to only print and check the trace")
+    parser.add_argument("--convert", default=None, type=str,
+                        help="trace set directory to convert the JSON lines file to, instead of showing a trace")
+
+    args = parser.parse_args()
+    if args.convert is not None:
+        convert(args.trace, args.convert)
+    elif os.path.isdir(args.trace) and args.index is None:
+        check_set(args.trace)
+    else:
+        trace, metadata = load(args.trace, args.index)
+        if metadata:
+            print(", ".join(f"{key}={value}" for key, value in metadata.items()))
+        dims = (len(trace) - 1) // 2
+        for name, values in zip(trace_names(dims), trace):
+            print(f"{name}:", np.asarray(values).tolist())
+        if dims == 2:
+            if "metric" in metadata:
+                print(f"Valid run of k-means: {bool(validate_trace(*trace, metric=metadata['metric']))}")
+            else:
+                print("Valid run of k-means: not checked (the metric of the run is unknown)")
+        if not args.no_visualize:
+            # without metadata (ex: files written before it was recorded), the grid is as large as the trace needs
+            grid_limit = metadata.get("grid_limit", int(max(np.abs(np.asarray(part)).max() for part in trace[:2 * dims])))
+            visualizer = Visualizer.from_trace(trace, dims, grid_limit)
+            if args.export is not None:
+                visualizer.export(args.export)
+            else:
+                visualizer.visualize()
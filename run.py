@@ -1,9 +1,9 @@
 import argparse
 
-from kmeans import main
+import numpy as np
 
-AVAILABLE_PROPERTIES = {"EMPTY_CENTER", "OVERLAP_CENTER", "EMPTY_CENTER_EACH_ITERATION",
-                        "OVERLAP_CENTER_EACH_ITERATION"}
+from constants import AVAILABLE_ENCODINGS, AVAILABLE_ENGINES, AVAILABLE_INITS, AVAILABLE_METRICS, AVAILABLE_PROPERTIES
+from dataset import load_points
 
 if __name__ == '__main__':
     """
@@ -16,20 +16,135 @@ if __name__ == '__main__':
     parser.add_argument("-p", "--num_points", default=10, type=int, help="Number of datapoints to generate")
     parser.add_argument("-c", "--num_centers", default=3, type=int, help="Number of clusters (and therefore, the number of cluster centers)")
     parser.add_argument("-g", "--grid_limit", default=5, type=int, help="board dimension (each axis goes from -grid_limit to grid_limit)")
+    parser.add_argument("--dims", default=2, type=int,
+                        help="number of coordinates of every datapoint and center (only the first 2 are visualized)")
     parser.add_argument("--random_centers", default=False, action="store_true",
-                        help="flag indicating whether or not to random initialize centers")
+                        help="flag indicating whether or not to random initialize centers (the same as --init uniform)")
+    parser.add_argument("--init", default=None, type=str,
+                        help=f"how to initialize the centers; must be one of {AVAILABLE_INITS} (by default, uniform "
+                             "with --random_centers and free otherwise)")
+    parser.add_argument("--init_centers", default=None, type=str,
+                        help="file (.csv or .npy, like --dataset) of initial centers to use with --init file")
     parser.add_argument("-prop", "--property", default=None, type=str,
                         help=f"which property to verify (if any); must be one of {AVAILABLE_PROPERTIES}")
+    parser.add_argument("--properties", nargs="+", default=None, type=str,
+                        help="properties to check in a single solver session instead of --property, reporting the "
+                             "result and time of each (requires --engine bmc)")
+    parser.add_argument("--symmetry_breaking", default=False, action="store_true",
+                        help="flag indicating whether or not to prune symmetric seeds and instances from the search")
+    parser.add_argument("-j", "--jobs", default=1, type=int, help="Number of worker processes to search with")
+    parser.add_argument("--engine", default="incremental", type=str,
+                        help=f"how to search for an instance; must be one of {AVAILABLE_ENGINES}")
+    parser.add_argument("--encoding", default="array", type=str,
+                        help=f"how centers and assignments are represented; must be one of {AVAILABLE_ENCODINGS}")
+    parser.add_argument("--metric", default="l1", type=str,
+                        help=f"distance between points and centers; must be one of {AVAILABLE_METRICS}")
+    parser.add_argument("--presearch", default=0, type=float,
+                        help="how long (in seconds) to look for an instance by simulating random inputs before invoking the solver")
+
+    parser.add_argument("--seed", default=None, type=int,
+                        help="seed for the random center initialization, including the farthest and kmeans++ ones "
+                             "(a random one is picked if not provided)")
+    parser.add_argument("--check_timeout", default=None, type=float,
+                        help="how long (in seconds) a single solver check may run for before it counts as inconclusive")
+    parser.add_argument("--time_budget", default=None, type=float, help="how long (in seconds) the whole search may run for")
+    parser.add_argument("--memory_budget", default=None, type=int,
+                        help="how much memory (in megabytes) z3 may use; at least 32, since z3 takes about 17MB before "
+                             "building any constraint")
+    parser.add_argument("--export", default=None, type=str,
+                        help="file to write the visualization to instead of displaying it (.gif/.mp4 for an "
+                             "animation, ex: .png/.pdf for one file per iteration)")
+    parser.add_argument("--save_trace", default=None, type=str,
+                        help=".npz file to write the instance to, which replay.py can show again without solving")
+    parser.add_argument("--dataset", default=None, type=str,
+                        help="file (.csv or .npy) of fixed datapoints to use; only the centers (and --free_points "
+                             "extra points) are solved for, and --num_points is ignored. With --init free, a few hundred "
+                             "points are practical; with concrete initial centers (ex: --init kmeans++), thousands")
+    parser.add_argument("--free_points", default=0, type=int,
+                        help="number of symbolic datapoints to add to the dataset")
+    parser.add_argument("--enumerate", default=None, type=str,
+                        help="JSON lines file to write every instance to (one per line) instead of visualizing the "
+                             "first one; requires --engine bmc, and stops at --max_instances or --time_budget")
+    parser.add_argument("--max_instances", default=None, type=int, help="how many instances to enumerate at most")
+    parser.add_argument("--profile", default=None, type=str,
+                        help="JSON file to write where the search spends its time to (also printed as a table)")
+    parser.add_argument("--server", default=None, type=str,
+                        help="Unix socket of a running server.py to send the search to, instead of solving it here "
+                             "(which skips loading z3)")
 
     args = parser.parse_args()
     num_iters = args.num_iters
     num_points = args.num_points
     num_centers = args.num_centers
     grid_limit = args.grid_limit
+    dims = args.dims
     random_centers = args.random_centers
+    init = args.init
     property = args.property
+    properties = args.properties
+    symmetry_breaking = args.symmetry_breaking
+    jobs = args.jobs
+    engine = args.engine
+    encoding = args.encoding
+    metric = args.metric
+    presearch_budget = args.presearch
+    seed = args.seed
+    profile_path = args.profile
+    check_timeout = args.check_timeout
+    time_budget = args.time_budget
+    memory_budget = args.memory_budget
+    export_path = args.export
+    trace_path = args.save_trace
+    enumerate_path = args.enumerate
+    max_instances = args.max_instances
+    points = None
+    if args.dataset:
+        # kept as arrays (memory-mapped for a .npy file) until the constraints are built
+        points = load_points(args.dataset, dims)
+        num_points = len(points[0]) + args.free_points
+        extent = int(max(np.abs(values).max() for values in points)) if len(points[0]) > 0 else 0
+        if extent > grid_limit:
+            print(f"Extending the grid limit to {extent} to cover the dataset")
+            grid_limit = extent
+    init_centers = None
+    if args.init_centers:
+        coords = load_points(args.init_centers, dims)
+        init_centers = tuple(values.tolist() for values in coords)
+        extent = int(max(np.abs(values).max() for values in coords)) if len(coords[0]) > 0 else 0
+        if extent > grid_limit:
+            print(f"Extending the grid limit to {extent} to cover the initial centers")
+            grid_limit = extent
 
-    if property and (property not in AVAILABLE_PROPERTIES):
-        raise ValueError(f"Unrecognized property provided; must be one of {AVAILABLE_PROPERTIES}")
-
-    main(num_iters, num_points, num_centers, grid_limit, random_centers, property)
+    # the arguments are validated by the model (KMeans), on the server with --server
+    if args.server:
+        if enumerate_path or properties or profile_path or memory_budget is not None or jobs > 1:
+            raise ValueError("--server only runs single searches (without --enumerate, --properties, --profile, "
+                             "--memory_budget or --jobs)")
+        from server import submit # only needs the standard library
+        config = dict(num_iters=num_iters, num_points=num_points, num_centers=num_centers, grid_limit=grid_limit,
+                      random_centers=random_centers, property=property, symmetry_breaking=symmetry_breaking, seed=seed,
+                      engine=engine, encoding=encoding, presearch_budget=presearch_budget, check_timeout=check_timeout,
+                      time_budget=time_budget, metric=metric, dims=dims, init=init,
+                      init_centers=init_centers,
+                      points=None if points is None else [values.tolist() for values in points]) # sent as JSON
+        response = submit(args.server, config)
+        if "error" in response:
+            raise RuntimeError(f"The server couldn't run the search: {response['error']}")
+        print(f"{response['status']} in {response['solve_time']:.3f}s{' (cached)' if response['cached'] else ''}")
+        if response["instance"] is not None:
+            from traces import trace_names
+            for name, values in zip(trace_names(dims), response["instance"]):
+                print(f"{name}:", values)
+            if trace_path is not None:
+                from traces import save_trace
+                save_trace(trace_path, response["instance"], dims, response["metadata"])
+                print(f"Trace written to {trace_path}")
+            if export_path is not None:
+                from visualizer import Visualizer
+                Visualizer.from_trace(response["instance"], dims, grid_limit).export(export_path)
+    else:
+        from kmeans import main # loads z3 (and matplotlib), which the client above doesn't need
+        main(num_iters, num_points, num_centers, grid_limit, random_centers, property, symmetry_breaking, jobs, engine, encoding,
+             presearch_budget, seed, profile_path, check_timeout, time_budget, memory_budget,
+             export_path, points, enumerate_path, max_instances, metric, dims, properties, init, init_centers,
+             trace_path)
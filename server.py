@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import time
+
+# outcomes that are worth caching: the same configuration (with the same seed) always has the same one
+CACHED_STATUSES = ("sat", "unsat")
+
+def _warm_up():
+    """
+    Loads z3 and the model (and everything they import, ex: matplotlib) once per worker process, and
+    runs a first check so that z3's context is initialized, instead of paying for it on the first job.
+    """
+    import kmeans
+    kmeans.Solver().check()
+
+def run_job(config: dict) -> dict:
+    """
+    Runs a single job (in a worker process): searches for an instance of the configuration. Returns
+    its status, solve time, instance (in the layout of KMeans.concrete_trace, or None), how far the
+    search got (see KMeans.report) and the parameters of the run (see KMeans.metadata).
+    params:
+        config: the KMeans arguments of the configuration
+    """
+    from kmeans import KMeans # already loaded by _warm_up
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # KMeans prints the instance it finds
+        kmeans = KMeans(**config)
+    return {"status": kmeans.status, "solve_time": time.perf_counter() - start,
+            "instance": kmeans.concrete_trace() if kmeans.sat else None, "report": kmeans.report(),
+            "metadata": kmeans.metadata()}
+
+def cacheable(config: dict) -> bool:
+    """
+    Returns whether the outcome of a configuration only depends on the configuration itself: unless
+    a seed is provided, the random initialization strategies draw different centers every time, and
+    the presearch simulates different random runs.
+    params:
+        config: the KMeans arguments of the configuration
+    """
+    random_init = config.get("random_centers") or config.get("init") in ("uniform", "farthest", "kmeans++")
+    random_presearch = (config.get("presearch_budget") or 0) > 0
+    return config.get("seed") is not None or not (random_init or random_presearch)
+
+class Server(object):
+
+    def __init__(self, jobs: int):
+        """
+        Answers job requests (one JSON object per line) with a pool of worker processes that are kept
+        running (with z3 loaded) between jobs. A request is either a job, {"id": ..., "config": {...}}
+        with the KMeans arguments of the configuration, which is answered with {"id": ..., **run_job(config),
+        "cached": ...} (or {"id": ..., "error": ...}), or one of {"op": "ping"} and {"op": "shutdown"}.
+        Requests are answered as soon as they are done, not necessarily in order, so they should have
+        an id to match them with. Outcomes of jobs that are sat or unsat are cached by configuration.
+        params:
+            jobs: number of worker processes (jobs that run at once)
+        """
+        self.jobs = jobs
+        self.pool = concurrent.futures.ProcessPoolExecutor(jobs, initializer=_warm_up)
+        for _ in range(jobs): # workers are only started on demand, so that they warm up before the first job
+            self.pool.submit(int)
+        self.cache = {}
+        self.jobs_done = 0
+        self.stopped = None # set once the event loop is running
+
+    async def handle(self, request: dict) -> dict:
+        """
+        Answers a single request.
+        params:
+            request: the decoded request
+        """
+        response = {"id": request.get("id")}
+        op = request.get("op", "job")
+        if op == "ping":
+            return {**response, "status": "ok", "jobs": self.jobs, "jobs_done": self.jobs_done, "cached": len(self.cache)}
+        if op == "shutdown":
+            self.stopped.set()
+            return {**response, "status": "shutting down"}
+        if op != "job" or not isinstance(request.get("config"), dict):
+            return {**response, "error": f"Unrecognized request: {request}"}
+
+        config = request["config"]
+        if config.get("jobs", 1) > 1:
+            return {**response, "error": "Jobs are run by a single worker each (jobs must be 1)"}
+        if config.get("memory_budget") is not None:
+            # a global z3 setting, which would stay in force for every later job of the worker
+            return {**response, "error": "Jobs can't set a memory budget"}
+        key = json.dumps(config, sort_keys=True)
+        if key in self.cache:
+            return {**response, **self.cache[key], "cached": True}
+        try:
+            outcome = await asyncio.get_running_loop().run_in_executor(self.pool, run_job, config)
+        except Exception as e: # ex: an invalid configuration, which shouldn't stop the server
+            return {**response, "error": f"{type(e).__name__}: {e}"}
+        self.jobs_done += 1
+        if outcome["status"] in CACHED_STATUSES and cacheable(config):
+            self.cache[key] = outcome
+        return {**response, **outcome, "cached": False}
+
+    async def serve_lines(self, reader: asyncio.StreamReader, write):
+        """
+        Reads requests from a stream until it is closed, and handles each of them concurrently,
+        writing each response as soon as it is ready.
+        params:
+            reader: the stream to read requests from
+            write: coroutine function that writes one encoded response line
+        """
+        async def respond(line: bytes):
+            try:
+                request = json.loads(line)
+                response = await self.handle(request) if isinstance(request, dict) else {"error": "Expected a JSON object"}
+            except json.JSONDecodeError as e:
+                response = {"error": f"Invalid JSON: {e}"}
+            await write((json.dumps(response) + "\n").encode())
+
+        tasks = set()
+        stopped = asyncio.create_task(self.stopped.wait())
+        while True:
+            read = asyncio.create_task(reader.readline())
+            await asyncio.wait([read, stopped], return_when=asyncio.FIRST_COMPLETED)
+            if not read.done(): # stop waiting for requests once the server shuts down
+                read.cancel()
+                break
+            line = read.result()
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        stopped.cancel()
+        await asyncio.gather(*tasks)
+
+    async def serve_socket(self, path: str):
+        """
+        Listens for connections on a Unix socket (each of which may send any number of requests) until
+        a shutdown request comes in.
+        params:
+            path: the path of the socket
+        """
+        self.stopped = asyncio.Event()
+        connections = set()
+        async def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            connections.add(asyncio.current_task())
+            lock = asyncio.Lock() # responses to concurrent requests mustn't interleave
+            async def write(data: bytes):
+                async with lock:
+                    writer.write(data)
+                    await writer.drain()
+            try:
+                await self.serve_lines(reader, write)
+            finally:
+                writer.close()
+                connections.discard(asyncio.current_task())
+
+        if os.path.exists(path):
+            os.remove(path) # left behind by a server that didn't shut down cleanly
+        server = await asyncio.start_unix_server(connected, path=path)
+        print(f"Serving on {path} with {self.jobs} workers", file=sys.stderr, flush=True)
+        async with server:
+            await self.stopped.wait()
+        # let every connection finish answering the requests it is running
+        await asyncio.gather(*connections)
+        os.remove(path)
+
+    async def serve_stdio(self):
+        """
+        Reads requests from stdin and writes the responses to stdout (ex: for a parent process that
+        keeps the server running as a pipe), until stdin is closed or a shutdown request comes in.
+        """
+        self.stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        async def write(data: bytes):
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+        await self.serve_lines(reader, write)
+
+def submit(path: str, config: dict, timeout: float = None) -> dict:
+    """
+    Client side: sends a single job to a server listening on a Unix socket, and waits for its
+    response. This only needs the standard library, so a client doesn't pay for loading z3.
+    params:
+        path: the path of the server's socket
+        config: the KMeans arguments of the configuration
+        timeout: how long (in seconds) to wait for the response (forever if not provided)
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall((json.dumps({"id": 0, "config": config}) + "\n").encode())
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+if __name__ == '__main__':
+    """
+    Runs the server until it is asked to shut down (or, with --stdio, until stdin is closed).
+    """
+    parser = argparse.ArgumentParser("Server: answers k-Means jobs with worker processes that keep z3 loaded")
+
+    parser.add_argument("--socket", default="kmeans.sock", type=str, help="path of the Unix socket to listen on")
+    parser.add_argument("--stdio", default=False, action="store_true",
+                        help="flag indicating whether or not to read requests from stdin and write the responses to "
+                             "stdout instead of listening on the socket")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count(), type=int, help="Number of jobs to run at once")
+
+    args = parser.parse_args()
+    if args.jobs < 1:
+        raise ValueError("There has to be at least one worker")
+    server = Server(args.jobs)
+    try:
+        asyncio.run(server.serve_stdio() if args.stdio else server.serve_socket(args.socket))
+    finally:
+        server.pool.shutdown()
@@ -0,0 +1,172 @@
+import numpy as np
+import time
+from typing import Tuple
+
+from constants import AVAILABLE_PROPERTIES
+
+def distances(px: np.ndarray, py: np.ndarray, cx: np.ndarray, cy: np.ndarray, metric: str = "l1") -> np.ndarray:
+    """
+    Computes the distance between every point and every center.
+    params:
+        px, py: point coordinates, of shape (..., num_points)
+        cx, cy: center coordinates, of shape (..., num_centers)
+        metric: one of constants.AVAILABLE_METRICS: "l1" (Manhattan), "l2sq" (squared Euclidean) or "linf" (Chebyshev)
+    Returns an array of shape (..., num_points, num_centers).
+    """
+    dx, dy = px[..., :, None] - cx[..., None, :], py[..., :, None] - cy[..., None, :]
+    if metric == "l2sq":
+        return dx * dx + dy * dy
+    if metric == "linf":
+        return np.maximum(np.abs(dx), np.abs(dy))
+    if metric == "l1":
+        return np.abs(dx) + np.abs(dy)
+    raise ValueError(f"Unrecognized metric provided: {metric}")
+
+def update_centers(px: np.ndarray, py: np.ndarray, cx: np.ndarray, cy: np.ndarray, assigned: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the next iteration's centers: the (rounded down) average of the points assigned to each
+    center, or the same position if no points are assigned to it (like KMeans.create_model).
+    params:
+        px, py: point coordinates, of shape (..., num_points)
+        cx, cy: center coordinates, of shape (..., num_centers)
+        assigned: the center number of each point, of shape (..., num_points)
+    """
+    one_hot = assigned[..., :, None] == np.arange(cx.shape[-1])
+    counts = one_hot.sum(axis=-2)
+    sum_x = (one_hot * px[..., :, None]).sum(axis=-2)
+    sum_y = (one_hot * py[..., :, None]).sum(axis=-2)
+    divisor = np.maximum(counts, 1)
+    return np.where(counts > 0, sum_x // divisor, cx), np.where(counts > 0, sum_y // divisor, cy)
+
+def simulate(px, py, cx0, cy0, num_iters: int, metric: str = "l1") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs k-means on concrete points and initial centers, in the layout used by KMeans: returns the
+    centers of each iteration, of shape (..., num_iters, num_centers) each (the first iteration's
+    centers are the initial ones), and the center assigned to each point in each iteration, of
+    shape (..., num_iters, num_points).
+
+    Any leading dimensions are treated as a batch of independent runs. Points that are equally
+    close to several centers are assigned to the lowest numbered one; the solver may pick any of
+    them, so use validate_trace (rather than comparing with simulate) to check solver instances.
+    params:
+        px, py: point coordinates, of shape (..., num_points)
+        cx0, cy0: initial center coordinates, of shape (..., num_centers)
+        num_iters: number of iterations for which to run the algorithm
+        metric: the distance between points and centers (one of constants.AVAILABLE_METRICS)
+    """
+    px, py = np.asarray(px, dtype=np.int64), np.asarray(py, dtype=np.int64)
+    cx, cy = np.asarray(cx0, dtype=np.int64), np.asarray(cy0, dtype=np.int64)
+    all_cx, all_cy, all_assigned = [], [], []
+    for _ in range(num_iters):
+        assigned = distances(px, py, cx, cy, metric).argmin(axis=-1)
+        all_cx.append(cx)
+        all_cy.append(cy)
+        all_assigned.append(assigned)
+        cx, cy = update_centers(px, py, cx, cy, assigned)
+    return np.stack(all_cx, axis=-2), np.stack(all_cy, axis=-2), np.stack(all_assigned, axis=-2)
+
+def validate_trace(px, py, cx, cy, pt_centers, metric: str = "l1") -> np.ndarray:
+    """
+    Checks that a trace (in the layout of KMeans.evaluate_model_vars, or a batch of them) is a
+    valid run of k-means: every point is assigned to one of its closest centers, and every
+    iteration's centers are correctly updated from the previous one. Returns a boolean (array).
+    params:
+        px, py: point coordinates, of shape (..., num_points)
+        cx, cy: center coordinates of each iteration, of shape (..., num_iters, num_centers)
+        pt_centers: center assigned to each point in each iteration, of shape (..., num_iters, num_points)
+        metric: the distance between points and centers (one of constants.AVAILABLE_METRICS)
+    """
+    px, py = np.asarray(px, dtype=np.int64)[..., None, :], np.asarray(py, dtype=np.int64)[..., None, :]
+    cx, cy = np.asarray(cx, dtype=np.int64), np.asarray(cy, dtype=np.int64)
+    pt_centers = np.asarray(pt_centers, dtype=np.int64)
+
+    dists = distances(px, py, cx, cy, metric)
+    assigned_dists = np.take_along_axis(dists, pt_centers[..., None], axis=-1)[..., 0]
+    closest = (assigned_dists == dists.min(axis=-1)).all(axis=(-2, -1))
+
+    next_cx, next_cy = update_centers(px, py, cx, cy, pt_centers)
+    updated = ((next_cx[..., :-1, :] == cx[..., 1:, :]) & (next_cy[..., :-1, :] == cy[..., 1:, :])).all(axis=(-2, -1))
+    return closest & updated
+
+def property_holds(cx, cy, pt_centers, property: str) -> np.ndarray:
+    """
+    Checks whether a trace (or a batch of them) satisfies one of the properties that KMeans can
+    verify, with the same semantics as its constraints (ex: for OVERLAP_CENTER_EACH_ITERATION, the
+    same pair of centers has to overlap in every iteration). Returns a boolean (array).
+    params:
+        cx, cy: center coordinates of each iteration, of shape (..., num_iters, num_centers)
+        pt_centers: center assigned to each point in each iteration, of shape (..., num_iters, num_points)
+        property: which property to check (if None, every trace satisfies it)
+    """
+    cx, cy, pt_centers = np.asarray(cx), np.asarray(cy), np.asarray(pt_centers)
+    num_centers = cx.shape[-1]
+    if property is None:
+        return np.ones(cx.shape[:-2], dtype=bool)
+
+    if property in ("EMPTY_CENTER", "EMPTY_CENTER_EACH_ITERATION"):
+        used = (pt_centers[..., :, :, None] == np.arange(num_centers)).any(axis=-2) # (..., num_iters, num_centers)
+        empty = ~used.all(axis=-1)
+        return empty[..., -1] if property == "EMPTY_CENTER" else empty.all(axis=-1)
+
+    if property in ("OVERLAP_CENTER", "OVERLAP_CENTER_EACH_ITERATION"):
+        overlap = (cx[..., :, :, None] == cx[..., :, None, :]) & (cy[..., :, :, None] == cy[..., :, None, :])
+        overlap &= ~np.eye(num_centers, dtype=bool) # (..., num_iters, num_centers, num_centers)
+        if property == "OVERLAP_CENTER":
+            return overlap[..., -1, :, :].any(axis=(-2, -1))
+        return overlap.all(axis=-3).any(axis=(-2, -1))
+
+    raise ValueError(f"Unrecognized property provided: {property}")
+
+def random_search(num_iters: int, num_points: int, num_centers: int, grid_limit: int, property: str, budget: float,
+                  rng: np.random.Generator, initial_centers: Tuple[list, list] = None, sorted_points: bool = False,
+                  batch_size: int = 10000, points: Tuple[list, list] = None, metric: str = "l1"):
+    """
+    Looks for an instance by simulating batches of random inputs (distinct points on the grid and,
+    unless provided, random initial centers) until one of them satisfies the property or the time
+    budget runs out. Returns the instance (px, py, cx, cy, pt_centers, as plain ints, in the layout
+    of KMeans.evaluate_model_vars) or None, along with the number of candidates tried and the number
+    of them that satisfied each property.
+    params:
+        num_iters, num_points, num_centers, grid_limit, property: as for KMeans
+        budget: how long to search for, in seconds
+        rng: random number generator to sample inputs with
+        initial_centers: fixed initial center coordinates (cx, cy) to use for every candidate
+        sorted_points: flag indicating whether or not points have to be in lexicographic order
+                       (as with KMeans' symmetry breaking)
+        batch_size: number of candidates to simulate at once
+        points: fixed point coordinates (px, py) to use for every candidate (ex: a dataset), so that
+                only the initial centers are sampled
+        metric: the distance between points and centers (one of constants.AVAILABLE_METRICS)
+    """
+    num_cells = (2 * grid_limit + 1) ** 2
+    hits = {prop: 0 for prop in AVAILABLE_PROPERTIES}
+    tried = 0
+    if points is None and num_points > num_cells: # there is no way to place the points without duplicates
+        return None, tried, hits
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < budget:
+        if points is not None:
+            px = np.broadcast_to(np.asarray(points[0], dtype=np.int64), (batch_size, num_points))
+            py = np.broadcast_to(np.asarray(points[1], dtype=np.int64), (batch_size, num_points))
+        else:
+            # the first num_points of a random permutation of the cells are distinct cells
+            cells = rng.random((batch_size, num_cells)).argpartition(num_points - 1, axis=1)[:, :num_points]
+            if sorted_points: # cell numbers are in the same order as (x, y) coordinates
+                cells.sort(axis=1)
+            px, py = cells // (2 * grid_limit + 1) - grid_limit, cells % (2 * grid_limit + 1) - grid_limit
+        if initial_centers is not None:
+            cx0 = np.broadcast_to(np.asarray(initial_centers[0]), (batch_size, num_centers))
+            cy0 = np.broadcast_to(np.asarray(initial_centers[1]), (batch_size, num_centers))
+        else:
+            cx0, cy0 = rng.integers(-grid_limit, grid_limit + 1, (2, batch_size, num_centers))
+
+        cx, cy, pt_centers = simulate(px, py, cx0, cy0, num_iters, metric)
+        tried += batch_size
+        for prop in AVAILABLE_PROPERTIES:
+            hits[prop] += int(property_holds(cx, cy, pt_centers, prop).sum())
+        found = np.flatnonzero(property_holds(cx, cy, pt_centers, property))
+        if found.size > 0:
+            i = found[0]
+            return (px[i].tolist(), py[i].tolist(), cx[i].tolist(), cy[i].tolist(), pt_centers[i].tolist()), tried, hits
+    return None, tried, hits
@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import time
+
+from kmeans import KMeans
+from constants import AVAILABLE_ENCODINGS, AVAILABLE_ENGINES, AVAILABLE_INITS, AVAILABLE_PROPERTIES
+
+# columns of the results file, in order (one row per configuration)
+COLUMNS = ["num_iters", "num_points", "num_centers", "grid_limit", "property", "seed", "random_centers", "init", "engine",
+           "encoding", "status", "solve_time", "instance"]
+
+def config_key(config: dict) -> str:
+    """
+    Returns the key under which the outcome of a configuration is cached: a hash of its parameters
+    (including the property and the seed).
+    params:
+        config: the KMeans arguments of the configuration
+    """
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+def load_cached(cache_dir: str, config: dict, timeout: float):
+    """
+    Returns the cached outcome of a configuration, or None if it has to be (re)computed: if it was
+    never computed, or if it timed out with a smaller timeout than the current one.
+    params:
+        cache_dir: directory holding the cache
+        config: the KMeans arguments of the configuration
+        timeout: the current timeout per configuration, in seconds
+    """
+    path = os.path.join(cache_dir, f"{config_key(config)}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        outcome = json.load(f)
+    if outcome["status"] == "timeout" and outcome["timeout"] < timeout:
+        return None
+    return outcome
+
+def store_cached(cache_dir: str, config: dict, outcome: dict):
+    """
+    Caches the outcome of a configuration (written to a temporary file first, so that a crash
+    can't leave a partial entry behind).
+    params:
+        cache_dir: directory holding the cache
+        config: the KMeans arguments of the configuration
+        outcome: the outcome to cache
+    """
+    path = os.path.join(cache_dir, f"{config_key(config)}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(outcome, f)
+    os.replace(f"{path}.tmp", path)
+
+def run_config(config: dict, conn):
+    """
+    Runs a single configuration (in a worker process) and sends its outcome through the provided
+    connection.
+    params:
+        config: the KMeans arguments of the configuration
+        conn: the connection to send the outcome through
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # KMeans prints the instance it finds
+        kmeans = KMeans(**config)
+    solve_time = time.perf_counter() - start
+    instance = kmeans.concrete_trace() if kmeans.sat else None
+    conn.send({"status": kmeans.status, "solve_time": solve_time, "instance": instance})
+    conn.close()
+
+def sweep(configs, jobs: int, timeout: float, cache_dir: str):
+    """
+    Computes the outcome of every configuration that isn't cached yet, running up to jobs of them
+    at a time in separate processes; a configuration that runs for longer than timeout seconds is
+    stopped, and its outcome is a timeout. Returns the outcomes of all configurations, in order.
+    params:
+        configs: the KMeans arguments of each configuration
+        jobs: number of configurations to run at once
+        timeout: how long a single configuration may run for, in seconds
+        cache_dir: directory holding the cache
+    """
+    outcomes = [load_cached(cache_dir, config, timeout) for config in configs]
+    pending = [index for index, outcome in enumerate(outcomes) if outcome is None]
+    print(f"{len(configs) - len(pending)} of {len(configs)} configurations are cached")
+
+    running = {} # config index -> (process, connection, start time)
+    while pending or running:
+        while pending and len(running) < jobs:
+            index = pending.pop(0)
+            recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=run_config, args=(configs[index], send_conn))
+            process.start()
+            send_conn.close()
+            running[index] = (process, recv_conn, time.perf_counter())
+
+        for index, (process, recv_conn, start) in list(running.items()):
+            outcome = None
+            if recv_conn.poll():
+                outcome = recv_conn.recv()
+            elif time.perf_counter() - start > timeout:
+                process.terminate()
+                outcome = {"status": "timeout", "solve_time": timeout, "instance": None}
+            elif not process.is_alive(): # crashed without sending anything
+                outcome = {"status": "error", "solve_time": time.perf_counter() - start, "instance": None}
+            if outcome is None:
+                continue
+            process.join()
+            del running[index]
+            outcome["timeout"] = timeout
+            if outcome["status"] != "error":
+                store_cached(cache_dir, configs[index], outcome)
+            outcomes[index] = outcome
+            print(f"{configs[index]}: {outcome['status']} ({outcome['solve_time']:.3f}s)", flush=True)
+        time.sleep(0.01)
+    return outcomes
+
+def write_results(path: str, configs, outcomes):
+    """
+    Writes one row per configuration (its parameters and outcome) to a CSV file with the columns
+    in COLUMNS; instances are stored as JSON.
+    params:
+        path: the results file to write
+        configs: the KMeans arguments of each configuration
+        outcomes: the outcome of each configuration
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for config, outcome in zip(configs, outcomes):
+            writer.writerow({**config, **outcome, "instance": json.dumps(outcome["instance"])})
+
+def summarize_inits(configs, outcomes):
+    """
+    Prints, for each initialization strategy and property, how many configurations reached an
+    instance and how long they took to (the median solve time of the ones that did), to compare how
+    quickly each strategy reaches the property.
+    params:
+        configs: the KMeans arguments of each configuration
+        outcomes: the outcome of each configuration
+    """
+    groups = {}
+    for config, outcome in zip(configs, outcomes):
+        groups.setdefault((config["init"], config["property"]), []).append(outcome)
+    print(f"{'init':>10} {'property':>30} {'sat':>9} {'median time to sat (s)':>23}")
+    for (init, property), group in sorted(groups.items()):
+        times = [outcome["solve_time"] for outcome in group if outcome["status"] == "sat"]
+        median = f"{statistics.median(times):.3f}" if times else "-"
+        print(f"{init:>10} {property:>30} {f'{len(times)}/{len(group)}':>9} {median:>23}")
+
+if __name__ == '__main__':
+    """
+    Runs every combination of the provided parameter ranges (skipping the ones that are already
+    cached) and writes the outcomes to a results file.
+    """
+    parser = argparse.ArgumentParser("Sweep: property verifications of the k-Means model across configurations")
+
+    parser.add_argument("-i", "--num_iters", nargs="+", default=[3], type=int, help="Numbers of iterations to try")
+    parser.add_argument("-p", "--num_points", nargs="+", default=[4, 6, 8], type=int, help="Numbers of datapoints to try")
+    parser.add_argument("-c", "--num_centers", nargs="+", default=[2, 3], type=int, help="Numbers of centers to try")
+    parser.add_argument("-g", "--grid_limit", nargs="+", default=[2, 3], type=int, help="Grid limits to try")
+    parser.add_argument("-prop", "--properties", nargs="+", default=sorted(AVAILABLE_PROPERTIES), type=str,
+                        help="properties to verify")
+    parser.add_argument("--seeds", nargs="+", default=[0], type=int, help="seeds for the random center initialization")
+    parser.add_argument("--random_centers", default=False, action="store_true",
+                        help="flag indicating whether or not to random initialize centers")
+    parser.add_argument("--inits", nargs="+", default=None, type=str,
+                        help="initialization strategies to compare (instead of --random_centers), ex: uniform farthest "
+                             "kmeans++; a summary per strategy and property is printed at the end")
+    parser.add_argument("--engine", default="incremental", type=str,
+                        help=f"how to search for an instance; must be one of {AVAILABLE_ENGINES}")
+    parser.add_argument("--encoding", default="array", type=str,
+                        help=f"how centers and assignments are represented; must be one of {AVAILABLE_ENCODINGS}")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count(), type=int, help="Number of configurations to run at once")
+    parser.add_argument("-t", "--timeout", default=60, type=float, help="How long a single configuration may run for, in seconds")
+    parser.add_argument("-o", "--out", default="sweep_results.csv", type=str, help="results file to write")
+    parser.add_argument("--cache_dir", default=".sweep_cache", type=str, help="directory holding the cache of outcomes")
+
+    args = parser.parse_args()
+    for property in args.properties:
+        if property not in AVAILABLE_PROPERTIES:
+            raise ValueError(f"Unrecognized property provided; must be one of {AVAILABLE_PROPERTIES}")
+    sweep_inits = tuple(init for init in AVAILABLE_INITS if init != "file") # there is no file of centers for every configuration
+    for init in args.inits or []:
+        if init not in sweep_inits:
+            raise ValueError(f"Unrecognized initialization provided; must be one of {sweep_inits}")
+    if args.engine not in AVAILABLE_ENGINES:
+        raise ValueError(f"Unrecognized engine provided; must be one of {AVAILABLE_ENGINES}")
+    if args.encoding not in AVAILABLE_ENCODINGS:
+        raise ValueError(f"Unrecognized encoding provided; must be one of {AVAILABLE_ENCODINGS}")
+
+    configs = [dict(num_iters=num_iters, num_points=num_points, num_centers=num_centers, grid_limit=grid_limit,
+                    random_centers=args.random_centers, property=property, seed=seed, engine=args.engine,
+                    encoding=args.encoding)
+               for num_iters, num_points, num_centers, grid_limit, property, seed in itertools.product(
+                   args.num_iters, args.num_points, args.num_centers, args.grid_limit, args.properties, args.seeds)]
+    if args.inits:
+        # only the configurations of a comparison have an init (so that the others keep their cache keys)
+        configs = [{**config, "init": init} for config in configs for init in args.inits]
+    os.makedirs(args.cache_dir, exist_ok=True)
+    outcomes = sweep(configs, args.jobs, args.timeout, args.cache_dir)
+    write_results(args.out, configs, outcomes)
+    print(f"Wrote {len(configs)} results to {args.out}")
+    if args.inits:
+        summarize_inits(configs, outcomes)
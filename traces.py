@@ -0,0 +1,189 @@
+import json
+import os
+import numpy as np
+from typing import Iterable, List, Tuple
+
+# files of a trace set directory (see save_traces), holding every trace's arrays stacked along a first axis
+TRACE_SET_ARRAYS = ("points", "centers", "pt_centers")
+# key of the header line of the JSON lines files written by KMeans.enumerate_instances, which holds the
+# metadata of the run (every other line is a trace)
+JSONL_METADATA_KEY = "metadata"
+
+def axis_name(dim: int) -> str:
+    """
+    Returns the name of the axis along the specified dimension (x, y and z for the first three,
+    then x3, x4, ...), which is used to name the coordinates along it (ex: px, cx).
+    params:
+        dim: the number of the dimension
+    """
+    return "xyz"[dim] if dim < 3 else f"x{dim}"
+
+def trace_names(dims: int) -> List[str]:
+    """
+    Returns the names of the parts of a trace, in the layout of KMeans.concrete_trace (ex: px, py,
+    cx, cy and pt_centers in 2D).
+    params:
+        dims: number of coordinates of every datapoint and center
+    """
+    axes = [axis_name(dim) for dim in range(dims)]
+    return [f"p{axis}" for axis in axes] + [f"c{axis}" for axis in axes] + ["pt_centers"]
+
+def compact(values) -> np.ndarray:
+    """
+    Returns the provided integers as an array of the smallest integer type that holds them (grid
+    coordinates and center numbers are small, so this is usually int8).
+    params:
+        values: the integers (ex: nested lists)
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return values.astype(np.int8)
+    return values.astype(np.promote_types(np.min_scalar_type(values.min()), np.min_scalar_type(values.max())))
+
+def trace_arrays(trace, dims: int) -> dict:
+    """
+    Converts a trace in the layout of KMeans.concrete_trace (ex: px, py, cx, cy, pt_centers in 2D)
+    into arrays: the points, of shape (num_points, dims), the centers in each iteration, of shape
+    (num_iters, num_centers, dims), and the center assigned to each point in each iteration, of shape
+    (num_iters, num_points).
+    params:
+        trace: the trace
+        dims: number of coordinates of every datapoint and center
+    """
+    points, centers, pt_centers = trace[:dims], trace[dims:2 * dims], trace[2 * dims]
+    return {"points": np.stack([np.asarray(coords, dtype=np.int64) for coords in points], axis=-1),
+            "centers": np.stack([np.asarray(coords, dtype=np.int64) for coords in centers], axis=-1),
+            "pt_centers": np.asarray(pt_centers, dtype=np.int64)}
+
+def arrays_trace(points: np.ndarray, centers: np.ndarray, pt_centers: np.ndarray) -> tuple:
+    """
+    The reverse of trace_arrays: returns the trace in the layout of KMeans.concrete_trace, with
+    one array per part. The arrays may also hold a batch of traces along their first axes (ex: a whole
+    set loaded by load_traces), in the layout that simulator.validate_trace takes.
+    params:
+        points, centers, pt_centers: the arrays of the trace (see trace_arrays)
+    """
+    dims = points.shape[-1]
+    return (*(points[..., dim] for dim in range(dims)), *(centers[..., dim] for dim in range(dims)), pt_centers)
+
+def save_trace(path: str, trace, dims: int, metadata: dict = None):
+    """
+    Writes a single trace (ex: the instance found by KMeans) to a compressed .npz file, along with
+    metadata about the run that produced it (ex: the grid limit and property). Coordinates and
+    center numbers are stored in the smallest integer type that holds them.
+    params:
+        path: the .npz file to write
+        trace: the trace, in the layout of KMeans.concrete_trace
+        dims: number of coordinates of every datapoint and center
+        metadata: JSON serializable information about the run
+    """
+    arrays = {name: compact(values) for name, values in trace_arrays(trace, dims).items()}
+    np.savez_compressed(path, **arrays, metadata=np.array(json.dumps(metadata or {})))
+
+def load_trace(path: str) -> Tuple[tuple, dict]:
+    """
+    Loads a trace written by save_trace. Returns the trace (in the layout of KMeans.concrete_trace,
+    as arrays) and the metadata of the run that produced it.
+    params:
+        path: the .npz file to read
+    """
+    with np.load(path) as f:
+        trace = arrays_trace(f["points"], f["centers"], f["pt_centers"])
+        metadata = json.loads(str(f["metadata"]))
+    return trace, metadata
+
+def save_traces(directory: str, traces: Iterable, num_traces: int, dims: int, metadata: dict = None):
+    """
+    Writes a set of traces of the same configuration (ex: the instances enumerated by
+    KMeans.enumerate_instances) to a directory, as one .npy file per array of TRACE_SET_ARRAYS (with
+    every trace stacked along its first axis) and a metadata.json file. The traces are written one at
+    a time into memory-mapped files (of int32, since the type has to be picked before all of them have
+    been seen), so the set never has to fit in memory, and load_traces can read them back the same way.
+    params:
+        directory: the directory to write (created if needed)
+        traces: the traces, in the layout of KMeans.concrete_trace (ex: a generator)
+        num_traces: how many traces there are
+        dims: number of coordinates of every datapoint and center
+        metadata: JSON serializable information about the run
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = None
+    for trace_num, trace in enumerate(traces):
+        arrays = trace_arrays(trace, dims)
+        if files is None: # the shapes are only known from the first trace
+            files = {name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                                     dtype=np.int32, shape=(num_traces, *values.shape))
+                     for name, values in arrays.items()}
+        for name, values in arrays.items():
+            files[name][trace_num] = values
+    for values in (files or {}).values():
+        values.flush()
+    with open(os.path.join(directory, "metadata.json"), "w") as f:
+        json.dump({**(metadata or {}), "num_traces": num_traces}, f)
+
+def load_traces(directory: str) -> Tuple[dict, dict]:
+    """
+    Loads a set of traces written by save_traces, memory-mapped rather than read into memory. Returns
+    the arrays of TRACE_SET_ARRAYS (indexed by trace number first; see trace_at) and the metadata.
+    params:
+        directory: the directory to read
+    """
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in TRACE_SET_ARRAYS}
+    with open(os.path.join(directory, "metadata.json")) as f:
+        metadata = json.load(f)
+    return arrays, metadata
+
+def trace_at(arrays: dict, trace_num: int) -> tuple:
+    """
+    Returns one trace of a set loaded by load_traces, in the layout of KMeans.concrete_trace.
+    params:
+        arrays: the arrays of the set
+        trace_num: the number of the trace (in the order they were written)
+    """
+    return arrays_trace(*(arrays[name][trace_num] for name in TRACE_SET_ARRAYS))
+
+def jsonl_header(metadata: dict) -> str:
+    """
+    Returns the header line of a JSON lines file of traces (see read_jsonl_metadata), which holds the
+    metadata of the run that produced them.
+    params:
+        metadata: JSON serializable information about the run
+    """
+    return json.dumps({JSONL_METADATA_KEY: metadata}) + "\n"
+
+def is_jsonl_header(record: dict) -> bool:
+    """
+    Returns whether a decoded line of a JSON lines file of traces is its header rather than a trace.
+    params:
+        record: the decoded line
+    """
+    return list(record) == [JSONL_METADATA_KEY]
+
+def read_jsonl_metadata(path: str) -> dict:
+    """
+    Returns the metadata of the run that wrote a JSON lines file of traces (see jsonl_header), or an
+    empty dict if the file has no header (ex: it was written before headers were).
+    params:
+        path: the JSON lines file to read
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                return record[JSONL_METADATA_KEY] if is_jsonl_header(record) else {}
+    return {}
+
+def read_jsonl_traces(path: str):
+    """
+    Yields the traces of a JSON lines file written by KMeans.enumerate_instances, one at a time, in
+    the layout of KMeans.concrete_trace (whose parts are the values of each line, in order). The
+    header line is skipped (see read_jsonl_metadata).
+    params:
+        path: the JSON lines file to read
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if not is_jsonl_header(record):
+                    yield tuple(record.values())
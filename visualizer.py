@@ -1,8 +1,18 @@
+import os
+import numpy as np
 import matplotlib.pyplot as plt
-from typing import List, Tuple, Dict
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from numpy.typing import ArrayLike
+
+# by default, points are only labeled with their center number when there are at most this many of them
+MAX_LABELED_POINTS = 50
 
 class Visualizer:
-    def __init__(self, num_iters: int, num_points: int, num_centers: int, grid_limit: int, px: List[int], py: List[int], cx: List[List[int]], cy: List[List[int]], pt_centers: List[List[int]]):
+    def __init__(self, num_iters: int, num_points: int, num_centers: int, grid_limit: int, px: ArrayLike, py: ArrayLike,
+                 cx: ArrayLike, cy: ArrayLike, pt_centers: ArrayLike, label_points: bool = None):
         """
         __init__ function (constructor) for the Visualizer class.
         params:
@@ -25,58 +35,121 @@ class Visualizer:
             pt_centers:  which center each point was assigned to across iterations (center
                          number of j-th point during the i-th iteration is present at row i
                          and column j i.e. at pt_centers[i][j])
+            label_points: flag indicating whether or not to label each point with its center number
+                          (by default, only if there are at most MAX_LABELED_POINTS points)
+        All coordinates and center numbers may be lists (ex: from KMeans) or NumPy arrays (ex: from
+        simulator.simulate).
         """
         self.num_iters = num_iters
         self.num_points = num_points
         self.num_centers = num_centers
         self.grid_limit = grid_limit
 
-        self.px = px
-        self.py = py
-        self.cx = cx
-        self.cy = cy
-        self.pt_centers = pt_centers
-    
-    def get_points_by_center(self, iter_num: int) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+        self.px = np.asarray(px)
+        self.py = np.asarray(py)
+        self.cx = np.asarray(cx)
+        self.cy = np.asarray(cy)
+        self.pt_centers = np.asarray(pt_centers)
+        assert ((self.pt_centers >= 0) & (self.pt_centers < num_centers)).all() # shouldn't be an invalid center_num
+        self.label_points = label_points if label_points is not None else num_points <= MAX_LABELED_POINTS
+
+    @classmethod
+    def from_trace(cls, trace, dims: int, grid_limit: int, label_points: bool = None):
         """
-        Identifies the points that are assigned to each center in the specified iteration.
+        Creates a Visualizer for a trace in the layout of KMeans.concrete_trace (ex: px, py, cx, cy,
+        pt_centers in 2D), with any number of dimensions: only the first two are shown, and 1D points
+        are shown along the x axis.
         params:
-            iter_num: which iteration to consider
+            trace: the trace (lists or NumPy arrays)
+            dims: number of coordinates of every datapoint and center
+            grid_limit: how far from the origin the grid extends along every axis
+            label_points: as for __init__
         """
-        points_x_by_center = {center_num: [] for center_num in range(self.num_centers)}
-        points_y_by_center = {center_num: [] for center_num in range(self.num_centers)}
-        for point_num in range(self.num_points):
-            pt_center_num = self.pt_centers[iter_num][point_num]
-            # pt_center_num = int(pt_center_num.as_string())
-            assert pt_center_num in points_x_by_center
-            assert pt_center_num in points_y_by_center
-            points_x_by_center[pt_center_num].append(self.px[point_num])
-            points_y_by_center[pt_center_num].append(self.py[point_num])
-        return points_x_by_center, points_y_by_center
-    
+        points, centers, pt_centers = trace[:dims], trace[dims:2 * dims], np.asarray(trace[2 * dims])
+        num_iters, num_points = pt_centers.shape
+        num_centers = np.shape(centers[0])[1]
+        if dims == 1:
+            points = (*points, np.zeros(num_points, dtype=int))
+            centers = (*centers, np.zeros((num_iters, num_centers), dtype=int))
+        elif dims > 2:
+            print(f"Visualizing the first 2 of {dims} dimensions")
+        return cls(num_iters, num_points, num_centers, grid_limit, points[0], points[1], centers[0], centers[1], pt_centers,
+                   label_points=label_points)
+
     def visualize(self):
         """
-        Primary visualization code: defines matplotlib subplots, creates color-coded plots and
-        displays them (creates and displays the visualization).
+        Primary visualization code: creates a color-coded plot for each iteration and displays them
+        one after the other (creates and displays the visualization).
         """
         for iter_num in range(self.num_iters):
-            # set limits of coordinates of graph
-            _, ax = plt.subplots()
-            ax.set(xlim=(-self.grid_limit-1, self.grid_limit+1), ylim=(-self.grid_limit-1, self.grid_limit+1), aspect='equal')
-
-            # draw grid lines
-            ax.grid(which='both', color='grey', linewidth=1, linestyle='-', alpha=0.2)
-
-            # get points for each center in this iteration
-            points_x_by_center, points_y_by_center = self.get_points_by_center(iter_num)
-            for center_num in range(self.num_centers):
-                x = points_x_by_center[center_num]
-                y = points_y_by_center[center_num]
-                ax.scatter(x, y)
-                for i in range(len(x)):
-                    ax.annotate(center_num, (x[i], y[i]))
-                ax.scatter([int(self.cx[iter_num][center_num].as_string())], [int(self.cy[iter_num][center_num].as_string())], marker='o', c='#000', alpha=0.2)
-                ax.annotate(f"c_{center_num}", (int(self.cx[iter_num][center_num].as_string()), int(self.cy[iter_num][center_num].as_string())))
+            fig = plt.figure()
+            update = self.create_artists(fig)
+            update(iter_num)
             # figManager = plt.get_current_fig_manager()
             # figManager.full_screen_toggle()
             plt.show()
+
+    def export(self, path: str, fps: float = 2):
+        """
+        Renders the visualization without displaying it (ex: on a headless machine). A .gif or .mp4
+        path is written as a single animation with one frame per iteration (.mp4 requires ffmpeg);
+        any other path (ex: .png or .pdf) is written as one file per iteration, with the iteration
+        number added to its name (ex: plot.png -> plot_0.png, plot_1.png, ...).
+        params:
+            path: the file to write
+            fps: frames (iterations) per second of an animation
+        """
+        fig = Figure()
+        FigureCanvasAgg(fig) # renders off-screen, without involving pyplot's (possibly interactive) backend
+        update = self.create_artists(fig)
+        stem, ext = os.path.splitext(path)
+        if ext.lower() in (".gif", ".mp4"):
+            writer = animation.PillowWriter(fps=fps) if ext.lower() == ".gif" else animation.FFMpegWriter(fps=fps)
+            animation.FuncAnimation(fig, update, frames=self.num_iters, blit=False).save(path, writer=writer)
+            return
+        for iter_num in range(self.num_iters):
+            update(iter_num)
+            fig.savefig(f"{stem}_{iter_num}{ext}")
+
+    def create_artists(self, fig: Figure):
+        """
+        Draws the first iteration on the provided figure, and returns a function that updates the
+        same artists in place to show another iteration (rather than drawing each one from scratch).
+        Points keep their position and only change color, centers move (leaving a trail of their
+        previous positions behind).
+        params:
+            fig: the figure to draw on
+        """
+        ax = fig.add_subplot()
+        ax.set(xlim=(-self.grid_limit-1, self.grid_limit+1), ylim=(-self.grid_limit-1, self.grid_limit+1), aspect='equal')
+        ax.grid(which='both', color='grey', linewidth=1, linestyle='-', alpha=0.2)
+        title = ax.set_title("")
+
+        # one color from the default cycle per center
+        center_colors = to_rgba_array([f"C{center_num % 10}" for center_num in range(self.num_centers)])
+        # the default marker size would cover the whole grid with many points
+        points = ax.scatter(self.px, self.py, s=min(36, max(1, 36000 / max(self.num_points, 1))), linewidths=0)
+        point_labels = []
+        if self.label_points:
+            point_labels = [ax.annotate("", (self.px[point_num], self.py[point_num])) for point_num in range(self.num_points)]
+        # centers (and their trails) are drawn on top of the points, which may cover the whole grid
+        centers = ax.scatter(self.cx[0], self.cy[0], marker='o', c='#000', alpha=0.2, zorder=3)
+        center_labels = [ax.annotate(f"c_{center_num}", (self.cx[0][center_num], self.cy[0][center_num]))
+                         for center_num in range(self.num_centers)]
+        trails = [ax.plot([], [], color=center_colors[center_num], alpha=0.5, linewidth=1, zorder=3)[0]
+                  for center_num in range(self.num_centers)]
+
+        def update(iter_num: int):
+            assigned = self.pt_centers[iter_num]
+            points.set_facecolor(center_colors[assigned])
+            for point_num, label in enumerate(point_labels):
+                label.set_text(str(assigned[point_num]))
+            centers.set_offsets(np.column_stack([self.cx[iter_num], self.cy[iter_num]]))
+            for center_num in range(self.num_centers):
+                center_labels[center_num].set_position((self.cx[iter_num][center_num], self.cy[iter_num][center_num]))
+                trails[center_num].set_data(self.cx[:iter_num + 1, center_num], self.cy[:iter_num + 1, center_num])
+            title.set_text(f"Iteration {iter_num}")
+            return [points, centers, title, *point_labels, *center_labels, *trails]
+
+        update(0)
+        return update